@@ -1,8 +1,8 @@
 WITH month_artist AS (
-SELECT strftime('%Y-%m', endTime) AS month, artistName, SUM(msPlayed) AS ms_month_artist
-FROM listens GROUP BY month, artistName),
+SELECT month, artist_id, SUM(ms) AS ms_month_artist
+FROM daily_rollup GROUP BY month, artist_id),
 month_total AS (SELECT month, SUM(ms_month_artist) AS ms_month_total FROM month_artist GROUP BY month)
-SELECT m.month, m.artistName, ROUND(100.0 * m.ms_month_artist / t.ms_month_total, 1) AS month_share_pct
-FROM month_artist m JOIN month_total t USING(month)
+SELECT printf('%d-%02d', m.month / 100, m.month % 100) AS month, a.artistName, ROUND(100.0 * m.ms_month_artist / t.ms_month_total, 1) AS month_share_pct
+FROM month_artist m JOIN month_total t USING(month) JOIN artists a USING(artist_id)
 WHERE m.ms_month_artist >= 30*60*1000
-ORDER BY m.month, month_share_pct DESC;
\ No newline at end of file
+ORDER BY m.month, month_share_pct DESC, a.artistName;
\ No newline at end of file
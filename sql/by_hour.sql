@@ -1,2 +1,2 @@
-SELECT CAST(strftime('%H', endTime) AS INTEGER) AS hour, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened
-FROM listens GROUP BY hour ORDER BY hour;
\ No newline at end of file
+SELECT hour, ROUND(SUM(ms)/3600000.0, 2) AS hours_listened
+FROM daily_rollup GROUP BY hour ORDER BY hour;
\ No newline at end of file
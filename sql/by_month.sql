@@ -1,3 +1,3 @@
-SELECT strftime('%Y-%m', endTime) AS month, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened,
-COUNT(DISTINCT artistName) AS unique_artists, COUNT(DISTINCT trackName) AS unique_tracks
-FROM listens GROUP BY month ORDER BY month;
\ No newline at end of file
+SELECT printf('%d-%02d', r.month / 100, r.month % 100) AS month, ROUND(SUM(r.ms)/3600000.0, 2) AS hours_listened,
+COUNT(DISTINCT r.artist_id) AS unique_artists, COUNT(DISTINCT t.trackName) AS unique_tracks
+FROM daily_rollup r JOIN tracks t USING(track_id) GROUP BY r.month ORDER BY r.month;
\ No newline at end of file
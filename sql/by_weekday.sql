@@ -1,4 +1,4 @@
-SELECT CASE strftime('%w', endTime)
-WHEN '0' THEN 'Sun' WHEN '1' THEN 'Mon' WHEN '2' THEN 'Tue' WHEN '3' THEN 'Wed' WHEN '4' THEN 'Thu' WHEN '5' THEN 'Fri' WHEN '6' THEN 'Sat' END AS weekday,
-ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened
-FROM listens GROUP BY strftime('%w', endTime) ORDER BY strftime('%w', endTime);
\ No newline at end of file
+SELECT CASE weekday
+WHEN 0 THEN 'Sun' WHEN 1 THEN 'Mon' WHEN 2 THEN 'Tue' WHEN 3 THEN 'Wed' WHEN 4 THEN 'Thu' WHEN 5 THEN 'Fri' WHEN 6 THEN 'Sat' END AS weekday,
+ROUND(SUM(ms)/3600000.0, 2) AS hours_listened
+FROM daily_rollup GROUP BY daily_rollup.weekday ORDER BY daily_rollup.weekday;
\ No newline at end of file
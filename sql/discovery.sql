@@ -1,4 +1,4 @@
-WITH first_seen AS (SELECT artistName, MIN(date(endTime)) AS first_date FROM listens GROUP BY artistName),
-calendar AS (SELECT DISTINCT date(endTime) AS d FROM listens),
-daily AS (SELECT c.d, COALESCE(SUM(CASE WHEN f.first_date = c.d THEN 1 ELSE 0 END),0) AS new_artists FROM calendar c LEFT JOIN first_seen f ON f.first_date = c.d GROUP BY c.d)
-SELECT d AS date, new_artists, SUM(new_artists) OVER (ORDER BY d ROWS UNBOUNDED PRECEDING) AS cumulative_artists FROM daily ORDER BY date;
\ No newline at end of file
+WITH first_seen AS (SELECT artist_id, MIN(day) AS first_day FROM daily_rollup GROUP BY artist_id),
+calendar AS (SELECT DISTINCT day AS d FROM daily_rollup),
+daily AS (SELECT c.d, COALESCE(SUM(CASE WHEN f.first_day = c.d THEN 1 ELSE 0 END),0) AS new_artists FROM calendar c LEFT JOIN first_seen f ON f.first_day = c.d GROUP BY c.d)
+SELECT date(d * 86400, 'unixepoch') AS date, new_artists, SUM(new_artists) OVER (ORDER BY d ROWS UNBOUNDED PRECEDING) AS cumulative_artists FROM daily ORDER BY d;
\ No newline at end of file
@@ -1,2 +1,2 @@
-WITH totals AS (SELECT COUNT(*) AS plays, COUNT(DISTINCT trackName) AS distinct_tracks FROM listens)
+WITH totals AS (SELECT (SELECT SUM(plays) FROM daily_rollup) AS plays, (SELECT COUNT(DISTINCT trackName) FROM tracks) AS distinct_tracks)
 SELECT plays, distinct_tracks, ROUND(1.0*plays/distinct_tracks,2) AS avg_plays_per_track FROM totals;
\ No newline at end of file
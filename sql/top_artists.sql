@@ -1,2 +1,3 @@
-SELECT artistName, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened, COUNT(*) AS plays
-FROM listens GROUP BY artistName ORDER BY hours_listened DESC, plays DESC LIMIT 25;
\ No newline at end of file
+WITH per_artist AS (SELECT artist_id, SUM(ms) AS ms, SUM(plays) AS plays FROM daily_rollup GROUP BY artist_id)
+SELECT a.artistName, ROUND(ms/3600000.0, 2) AS hours_listened, plays
+FROM per_artist JOIN artists a USING(artist_id) ORDER BY hours_listened DESC, plays DESC, a.artistName LIMIT 25;
\ No newline at end of file
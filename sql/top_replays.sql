@@ -1,2 +1,3 @@
-SELECT trackName, artistName, COUNT(*) AS play_sessions, ROUND(SUM(msPlayed)/60000.0,1) AS minutes_listened
-FROM listens GROUP BY trackName, artistName HAVING play_sessions >= 3 ORDER BY play_sessions DESC, minutes_listened DESC LIMIT 50;
\ No newline at end of file
+WITH per_track AS (SELECT track_id, SUM(plays) AS play_sessions, SUM(ms) AS ms FROM daily_rollup GROUP BY track_id HAVING play_sessions >= 3)
+SELECT t.trackName, a.artistName, play_sessions, ROUND(ms/60000.0,1) AS minutes_listened
+FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id) ORDER BY play_sessions DESC, minutes_listened DESC, t.trackName, a.artistName LIMIT 50;
\ No newline at end of file
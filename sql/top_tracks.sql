@@ -1,2 +1,3 @@
-SELECT trackName, artistName, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened, COUNT(*) AS plays
-FROM listens GROUP BY trackName, artistName ORDER BY hours_listened DESC, plays DESC LIMIT 25;
\ No newline at end of file
+WITH per_track AS (SELECT track_id, SUM(ms) AS ms, SUM(plays) AS plays FROM daily_rollup GROUP BY track_id)
+SELECT t.trackName, a.artistName, ROUND(ms/3600000.0, 2) AS hours_listened, plays
+FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id) ORDER BY hours_listened DESC, plays DESC, t.trackName, a.artistName LIMIT 25;
\ No newline at end of file
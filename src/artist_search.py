@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Fuzzy artist search over a trigram index built at import time.
+#
+# Names are folded to a search key (lowercase, accents stripped, đ -> d, runs of
+# punctuation -> one space) so "son tung mtp" finds "Sơn Tùng M-TP". Each key's
+# trigrams go into artist_grams; a query is folded the same way, candidates are
+# the artists sharing most trigrams with it, and those are ranked in Python.
+import json, re, sqlite3, unicodedata
+
+# letters NFKD does not decompose into base letter + accent
+FOLD = str.maketrans({"đ": "d", "Đ": "d", "ð": "d", "Ð": "d", "ø": "o", "Ø": "o", "ł": "l", "Ł": "l",
+                      "æ": "ae", "Æ": "ae", "œ": "oe", "Œ": "oe", "ı": "i", "þ": "th", "Þ": "th"})
+CANDIDATES = 200      # artists re-ranked per query
+MIN_SIMILARITY = 0.3  # trigram Jaccard below which non-substring matches are dropped
+
+def fold(name: str) -> str:
+    s = unicodedata.normalize("NFKD", name.translate(FOLD))
+    s = "".join(c for c in s if not unicodedata.combining(c)).casefold()
+    return " ".join(re.sub(r"[\W_]+", " ", s).split())
+
+def trigrams(key: str) -> set:
+    # padded like pg_trgm, so one- and two-letter queries still match word starts
+    return {w[i:i + 3] for word in key.split() for w in [f"  {word} "] for i in range(len(w) - 2)}
+
+def index_artists(cur):
+    # Add search keys and trigrams for artists not indexed yet (all of them on a rebuild)
+    rows = cur.execute("""
+        SELECT artist_id, artistName FROM artists
+        WHERE artist_id NOT IN (SELECT artist_id FROM artist_keys)
+    """).fetchall()
+    keys, grams = [], []
+    for artist_id, name in rows:
+        key = fold(name)
+        g = trigrams(key)
+        keys.append((artist_id, key, len(g)))
+        grams += [(gram, artist_id) for gram in g]
+    cur.executemany("INSERT INTO artist_keys(artist_id, name_key, grams) VALUES (?,?,?)", keys)
+    cur.executemany("INSERT INTO artist_grams(gram, artist_id) VALUES (?,?)", grams)
+    return len(rows)
+
+def rank(key: str, name_key: str, similarity: float):
+    # exact key, then key prefix, then word prefix, then substring, then trigram similarity
+    tier = (3 if name_key == key else 2 if name_key.startswith(key)
+            else 1 if f" {key}" in f" {name_key}" else 0.5 if key in name_key else 0)
+    return tier, similarity
+
+def candidates(con, key: str, grams: set):
+    try:
+        return con.execute("""
+            SELECT k.artist_id, k.name_key, k.grams, COUNT(*) AS shared
+            FROM artist_grams g JOIN artist_keys k USING(artist_id)
+            WHERE g.gram IN (SELECT value FROM json_each(?))
+            GROUP BY g.artist_id
+            ORDER BY shared DESC
+            LIMIT ?
+        """, (json.dumps(sorted(grams)), CANDIDATES)).fetchall()
+    except sqlite3.OperationalError:
+        # database from before the index existed: fold every name instead
+        out = []
+        for artist_id, name in con.execute("SELECT artist_id, artistName FROM artists"):
+            k = fold(name)
+            g = trigrams(k)
+            if g & grams:
+                out.append((artist_id, k, len(g), len(g & grams)))
+        return out
+
+def search(con, text: str, limit: int = 10):
+    # Ranked matches as (artist_id, artistName), best first; ties go to the most played artist
+    key = fold(text)
+    grams = trigrams(key)
+    if not grams:
+        return []
+    scored = {}
+    for artist_id, name_key, n, shared in candidates(con, key, grams):
+        r = rank(key, name_key, shared / (len(grams) + n - shared))
+        if r[0] or r[1] >= MIN_SIMILARITY:
+            scored[artist_id] = r
+    if not scored:
+        return []
+    ids = json.dumps(list(scored))
+    ms = dict(con.execute("""
+        SELECT artist_id, SUM(ms) FROM daily_rollup
+        WHERE artist_id IN (SELECT value FROM json_each(?)) GROUP BY artist_id
+    """, (ids,)).fetchall())
+    names = dict(con.execute("""
+        SELECT artist_id, artistName FROM artists WHERE artist_id IN (SELECT value FROM json_each(?))
+    """, (ids,)).fetchall())
+    best = sorted(scored, key=lambda a: (scored[a], ms.get(a, 0), -a), reverse=True)[:limit]
+    return [(a, names[a]) for a in best]
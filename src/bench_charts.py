@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# Time eda_charts.py drawing serially vs on a process pool, on a synthetic DB, and
+# check that every mode writes byte-identical PNGs.
+import pathlib, tempfile, shutil, time, argparse, os, contextlib, io
+import build_graph, eda_charts
+from synth_history import write_db
+
+def run(jobs: int, out: pathlib.Path):
+    eda_charts.OUT = out
+    build_graph.CHART_CACHE = out / "chart_cache"  # not the real cache/charts
+    out.mkdir(parents=True, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        eda_charts.main(["--force", "--jobs", str(jobs)])
+        return time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser(description="Serial vs process-pool chart rendering benchmark")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--jobs", default=f"1,2,{os.cpu_count() or 1}", help="comma-separated process counts")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="spotify_charts_bench_"))
+    try:
+        eda_charts.DB = tmp / "bench.db"
+        t0 = time.perf_counter()
+        write_db(eda_charts.DB, args.rows)
+        print(f"Synthetic DB: {args.rows} plays ({time.perf_counter() - t0:.1f}s to build), {os.cpu_count()} CPUs")
+        print(f"{'jobs':>4} {'best s':>8} {'speedup':>8}")
+        base, pngs = None, {}
+        for jobs in sorted({int(j) for j in args.jobs.split(",")}):
+            out = tmp / f"out_{jobs}"
+            best = min(run(jobs, out) for _ in range(args.repeat))
+            base = base or best
+            pngs[jobs] = {p.name: p.read_bytes() for p in out.glob("chart_*.png")}
+            print(f"{jobs:>4} {best:>8.2f} {base / best:>7.2f}x")
+        first = next(iter(pngs.values()))
+        diff = sorted({name for files in pngs.values() for name in files if files[name] != first.get(name)})
+        print("PNGs identical across modes." if not diff else f"PNGs differ: {', '.join(diff)}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# Benchmark serial vs process-pool parsing in import_data.py on a synthetic export.
+import pathlib, tempfile, shutil, time, argparse, os
+import import_data
+from synth_history import write_history
+
+def time_parse(paths, workers):
+    t0 = time.perf_counter()
+    n = sum(sum(1 for _ in rows) for _, rows in import_data.iter_parsed(paths, workers))
+    return n, time.perf_counter() - t0
+
+def time_import(paths, workers, db):
+    import_data.DB = db
+    t0 = time.perf_counter()
+    n = import_data.rebuild(paths, import_data.BATCH_SIZE, workers)
+    return n, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser(description="Serial vs process-pool import benchmark")
+    ap.add_argument("--files", type=int, default=30)
+    ap.add_argument("--rows-per-file", type=int, default=10000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="spotify_bench_"))
+    try:
+        paths = write_history(tmp, args.files * args.rows_per_file, rows_per_file=args.rows_per_file)
+        print(f"Synthetic export: {len(paths)} files x {args.rows_per_file} rows")
+        print(f"{'stage':<8} {'workers':>7} {'rows':>9} {'seconds':>8} {'speedup':>8}")
+        for stage, fn in [("parse", lambda w: time_parse(paths, w)),
+                          ("import", lambda w: time_import(paths, w, tmp / f"bench_{w}.db"))]:
+            base = None
+            for w in [1, args.workers]:
+                n, secs = fn(w)
+                base = base or secs
+                print(f"{stage:<8} {w:>7} {n:>9} {secs:>8.2f} {base / secs:>7.2f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
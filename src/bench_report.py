@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# Time build_report.py's scan engine against the per-query SQL engine on a large synthetic DB.
+import pathlib, tempfile, shutil, sqlite3, time, argparse
+import pandas as pd
+import build_report
+from synth_history import write_db
+
+def same(a, b):
+    # metrics hold frames, dicts of frames (sessions, streaks) and plain values
+    if isinstance(a, pd.DataFrame):
+        return isinstance(b, pd.DataFrame) and a.reset_index(drop=True).equals(b.reset_index(drop=True))
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    return a == b
+
+def main():
+    ap = argparse.ArgumentParser(description="Scan vs SQL report engine benchmark")
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="spotify_report_bench_"))
+    try:
+        db = tmp / "bench.db"
+        t0 = time.perf_counter()
+        write_db(db, args.rows)
+        con = sqlite3.connect(db)
+        n_rollup = con.execute("SELECT COUNT(*) FROM daily_rollup").fetchone()[0]
+        print(f"Synthetic DB: {args.rows} plays, {n_rollup} rollup rows ({time.perf_counter() - t0:.1f}s to build)")
+        print(f"{'engine':<6} {'best s':>8} {'speedup':>8}")
+        results, base = {}, None
+        for name in ["sql", "scan"]:
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                results[name] = build_report.ENGINES[name](con)
+                best = min(best, time.perf_counter() - t0)
+            base = base or best
+            print(f"{name:<6} {best:>8.2f} {base / best:>7.2f}x")
+        con.close()
+        diff = [k for k in results["sql"] if not same(results["sql"][k], results["scan"][k])]
+        print("Metrics identical." if not diff else f"Metrics differ: {', '.join(diff)}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Scale benchmark: time every pipeline stage and every shipped query on synthetic
+# histories of increasing size and write the results as JSON, one file per commit,
+# so runs can be compared across commits (--compare).
+import pathlib, tempfile, shutil, sqlite3, time, argparse, json, re, os, platform, subprocess, contextlib, io
+import import_data, run_all, eda_charts, build_report, build_graph
+from synth_history import write_history
+from check_query_plans import shipped_queries
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+RESULTS = ROOT / "bench_results"
+# queries in these scripts are tooling, not part of the pipeline or dashboard
+TOOLS = ("src/bench_", "src/check_query_plans.py", "src/synth_history.py")
+SIZE_QUERIES = {
+    "plays": "SELECT COUNT(*) FROM plays",
+    "daily_rollup": "SELECT COUNT(*) FROM daily_rollup",
+    "duration_rollup": "SELECT COUNT(*) FROM duration_rollup",
+    "artists": "SELECT COUNT(*) FROM artists",
+    "tracks": "SELECT COUNT(*) FROM tracks",
+    "artist_grams": "SELECT COUNT(*) FROM artist_grams",
+    "sessions": "SELECT COUNT(*) FROM sessions",
+    "transition_nnz": "SELECT COALESCE(SUM(nnz), 0) FROM transitions",
+}
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timed(fn, repeat: int = 1):
+    # best wall time of `repeat` runs, stage output silenced
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+    return round(best, 4)
+
+def bind(sql: str, lo: int, hi: int):
+    # Parameters for a shipped query: date ranges span the whole history, any other
+    # placeholder (artist name/id) gets 1
+    params = []
+    for m in re.finditer(r"BETWEEN\s+\?\s+AND\s+\?|\?", sql, re.I):
+        params += [lo, hi] if m.group(0) != "?" else [1]
+    return params
+
+def point_at(db: pathlib.Path, out: pathlib.Path):
+    import_data.DB = db
+    run_all.DB = eda_charts.DB = build_report.DB = db
+    run_all.OUT = eda_charts.OUT = build_report.OUT_DIR = out
+    build_report.IMG_DIR = out / "report_images"
+    build_report.IMG_DIR.mkdir(parents=True, exist_ok=True)
+    # keep synthetic charts out of the real cache/charts
+    build_graph.CHART_CACHE = out / "chart_cache"
+
+def bench_scale(plays: int, tmp: pathlib.Path, args):
+    data, out = tmp / f"data_{plays}", tmp / f"out_{plays}"
+    db = tmp / f"spotify_{plays}.db"
+    point_at(db, out)
+    stages = {}
+    t0 = time.perf_counter()
+    paths = write_history(data, plays, seed=args.seed)
+    stages["generate"] = round(time.perf_counter() - t0, 4)
+    # incremental: load all but the last ~10% of files, then append the rest
+    head = paths[:max(1, len(paths) * 9 // 10)]
+    stages["import"] = timed(lambda: import_data.rebuild(paths, import_data.BATCH_SIZE, args.workers))
+    timed(lambda: import_data.rebuild(head, import_data.BATCH_SIZE, args.workers))
+    stages["import_incremental"] = timed(lambda: import_data.append_new(paths, import_data.BATCH_SIZE, args.workers))
+    stages["run_all"] = timed(lambda: run_all.main(["--jobs", "1", "--force"]), args.repeat)
+    stages["run_all_parallel"] = timed(lambda: run_all.main(["--jobs", "0", "--force"]), args.repeat)
+    stages["eda_charts"] = timed(lambda: eda_charts.main(["--jobs", "1", "--force"]), args.repeat)
+    stages["eda_charts_parallel"] = timed(lambda: eda_charts.main(["--jobs", "0", "--force"]), args.repeat)
+    for engine in sorted(build_report.ENGINES):
+        stages[f"build_report_{engine}"] = timed(lambda: build_report.main(["--engine", engine, "--force"]), args.repeat)
+
+    con = sqlite3.connect(db)
+    lo, hi = con.execute("SELECT MIN(day), MAX(day) FROM daily_rollup").fetchone()
+    queries = {}
+    for where, sql in shipped_queries():
+        if where.startswith(TOOLS):
+            continue
+        params = bind(sql, lo, hi)
+        try:
+            queries[where] = timed(lambda: con.execute(sql, params).fetchall(), args.repeat)
+        except sqlite3.Error:
+            pass  # only valid mid-upgrade (listens_legacy); check_query_plans covers those
+    sizes = {t: con.execute(sql).fetchone()[0] for t, sql in SIZE_QUERIES.items()}
+    con.close()
+    return dict(plays=plays, files=len(paths), db_bytes=db.stat().st_size, rows=sizes,
+                stages=stages, queries=queries)
+
+def print_scale(r, base=None):
+    print(f"\n== {r['plays']:,} plays ({r['rows']['daily_rollup']:,} rollup rows, {r['db_bytes'] / 2**20:.1f} MB) ==")
+    for kind in ["stages", "queries"]:
+        old = (base or {}).get(kind, {})
+        for name, secs in r[kind].items():
+            vs = f" {old[name] / secs:>6.2f}x" if old.get(name) and secs else ""
+            print(f"  {name:<48} {secs:>9.4f}s{vs}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Time pipeline stages and shipped queries on synthetic histories")
+    ap.add_argument("--scales", default="100000,1000000",
+                    help="comma-separated play counts (e.g. 1000000,10000000,100000000)")
+    ap.add_argument("--repeat", type=int, default=3, help="best-of runs for queries and read-only stages")
+    ap.add_argument("--workers", type=int, default=1, help="import_data --workers")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=pathlib.Path, default=None, help="default: bench_results/<commit>.json")
+    ap.add_argument("--compare", type=pathlib.Path, default=None, help="earlier results JSON to show speedups against")
+    args = ap.parse_args()
+
+    commit = git("rev-parse", "--short", "HEAD")
+    dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    base = json.loads(args.compare.read_text()) if args.compare else None
+    base_by_plays = {r["plays"]: r for r in base["scales"]} if base else {}
+    result = dict(commit=commit, dirty=dirty, created=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  python=platform.python_version(), sqlite=sqlite3.sqlite_version,
+                  machine=platform.machine(), cpus=os.cpu_count(), seed=args.seed, repeat=args.repeat,
+                  scales=[])
+    if base:
+        print(f"Speedups are relative to {args.compare} (commit {base.get('commit')})")
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="spotify_suite_"))
+    try:
+        for plays in (int(s) for s in args.scales.split(",")):
+            r = bench_scale(plays, tmp, args)
+            result["scales"].append(r)
+            print_scale(r, base_by_plays.get(plays))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    out = args.out or RESULTS / f"{commit or 'unknown'}{'-dirty' if dirty else ''}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"\nResults written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Minimal build graph for pipeline outputs.
+#
+# Every output file is recorded in outputs/.manifest.json together with the
+# fingerprints of what it was built from (database content, SQL text, code,
+# templates). A script only rebuilds the outputs whose recorded inputs differ
+# from the current ones or whose file is missing; --force rebuilds everything.
+#
+# Charts that do have to be rebuilt are also looked up in a content-addressed
+# cache of rendered PNGs, keyed on the data being plotted and the code plotting
+# it, so a chart whose data did not change is copied instead of redrawn. --force
+# neither reads nor fills the cache unless --refresh-cache asks it to store.
+import json, hashlib, inspect, os, pathlib, shutil, sqlite3
+import numpy as np
+import pandas as pd
+import matplotlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+MANIFEST = ".manifest.json"
+CHART_CACHE = ROOT / "cache" / "charts"  # benchmarks point this at a temp dir
+CHART_CACHE_MB = 128
+
+def file_hash(path: pathlib.Path):
+    # sha256 of a file's bytes, None when it does not exist
+    p = pathlib.Path(path)
+    if not p.exists():
+        return None
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def code_hash(*objs):
+    # sha256 of the source of the given functions, so editing one chart only rebuilds that chart
+    return hashlib.sha256("\n".join(inspect.getsource(o) for o in objs).encode("utf-8")).hexdigest()
+
+def _feed(h, obj):
+    # hash a plotting input: arrays by dtype/shape/bytes, frames per column, containers recursively
+    if isinstance(obj, pd.DataFrame):
+        h.update(b"frame")
+        _feed(h, {str(c): obj[c].to_numpy() for c in obj.columns})
+        _feed(h, obj.index.to_numpy())
+    elif isinstance(obj, pd.Series):
+        _feed(h, [str(obj.name), obj.to_numpy(), obj.index.to_numpy()])
+    elif isinstance(obj, np.ndarray) and obj.dtype != object:
+        h.update(f"nd{obj.dtype.str}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b"dict%d" % len(obj))
+        for k in sorted(obj):
+            _feed(h, k)
+            _feed(h, obj[k])
+    elif isinstance(obj, (list, tuple, np.ndarray)):
+        h.update(b"seq%d" % len(obj))
+        for v in obj:
+            _feed(h, v)
+    else:
+        h.update(f"{type(obj).__name__}:{obj!r};".encode("utf-8"))
+
+def content_hash(*parts):
+    h = hashlib.sha256(matplotlib.__version__.encode())
+    for part in parts:
+        _feed(h, part)
+    return h.hexdigest()
+
+def db_fingerprint(db: pathlib.Path):
+    # Content fingerprint of a database built by import_data.py: the schema version,
+    # every loaded export file's name, sha256 and row range, and the import settings
+    # (session gap). This is cheap even for large databases and survives rebuilds that
+    # produce identical content. Other databases (no source_files table) fall back to
+    # hashing the file.
+    con = sqlite3.connect(f"file:{pathlib.Path(db).as_posix()}?mode=ro", uri=True)
+    try:
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        files = con.execute("SELECT path, sha256, rows, min_endTime, max_endTime FROM source_files ORDER BY path").fetchall()
+    except sqlite3.Error:
+        files = None
+    try:
+        settings = con.execute("SELECT key, value FROM settings ORDER BY key").fetchall()
+    except sqlite3.Error:
+        settings = []
+    finally:
+        con.close()
+    if not files:
+        return "file:" + file_hash(db)
+    return "src:" + hashlib.sha256(json.dumps([version, files, settings]).encode("utf-8")).hexdigest()
+
+class Manifest:
+    def __init__(self, out_dir: pathlib.Path, force: bool = False):
+        self.root = pathlib.Path(out_dir)
+        self.path = self.root / MANIFEST
+        self.force = force
+        self.entries = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+
+    def key(self, output: pathlib.Path):
+        return pathlib.Path(output).relative_to(self.root).as_posix()
+
+    def stale(self, output: pathlib.Path, inputs: dict) -> bool:
+        return self.force or not pathlib.Path(output).exists() or self.entries.get(self.key(output)) != inputs
+
+    def record(self, output: pathlib.Path, inputs: dict):
+        self.entries[self.key(output)] = inputs
+
+    def save(self):
+        # re-read so scripts that share the manifest don't drop each other's entries
+        merged = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+        merged.update(self.entries)
+        self.path.write_text(json.dumps(merged, indent=1, sort_keys=True), encoding="utf-8")
+
+class ChartCache:
+    # Rendered PNGs named by content_hash, evicted least recently used first once the
+    # directory grows past max_mb
+    def __init__(self, root: pathlib.Path | None = None, max_mb: int = CHART_CACHE_MB):
+        self.root = pathlib.Path(root or CHART_CACHE)
+        self.max_bytes = max_mb * 2**20
+        self.hits = self.misses = 0
+
+    def fetch(self, key: str, dest: pathlib.Path) -> bool:
+        src = self.root / f"{key}.png"
+        try:
+            shutil.copyfile(src, dest)
+            os.utime(src)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key: str, src: pathlib.Path):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f"{key}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, self.root / f"{key}.png")
+        entries = sorted((p.stat().st_mtime_ns, p.stat().st_size, p) for p in self.root.glob("*.png"))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
-import sqlite3, pathlib, pandas as pd, numpy as np
+import sqlite3, pathlib, argparse, time, pandas as pd, numpy as np
 import matplotlib.pyplot as plt
 from jinja2 import Template
+from sqlite_compat import sql_round
+from sessions import SESSION_GAP_MIN, summarize
+from streaks import calendar_streaks, longest_streaks, top_streaks
+from build_graph import ChartCache, Manifest, code_hash, content_hash, db_fingerprint, file_hash
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DB = ROOT / "db" / "spotify.db"
 OUT_DIR = ROOT / "outputs"
 IMG_DIR = OUT_DIR / "report_images"
 CACHE_DIR = ROOT / "cache"
+TEMPLATE = ROOT / "src" / "report_template.md.j2"
+# this script and the local modules it imports: editing any of them can change the outputs
+CODE = [pathlib.Path(__file__), ROOT / "src" / "sqlite_compat.py", ROOT / "src" / "sessions.py",
+        ROOT / "src" / "streaks.py", ROOT / "src" / "build_graph.py"]
 OUT_DIR.mkdir(parents=True, exist_ok=True); IMG_DIR.mkdir(parents=True, exist_ok=True)
 
+WEEKDAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+# rollup rows fetched per fold in the scan engine
+SCAN_CHUNK = 1 << 16
+
 def q(con, sql, params=None):
     return pd.read_sql_query(sql, con, params=params)
 
@@ -17,131 +29,121 @@ def fmt_table(df, max_rows=10):
     if df.empty: return "_(no data)_"
     return df.head(max_rows).to_markdown(index=False)
 
-def plot_monthly(con):
-    df = q(con, """
-        SELECT strftime('%Y-%m', endTime) AS month,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY month ORDER BY month;
+def loyalty(hhi):
+    return "Explorer" if hhi < 0.07 else ("Balanced" if hhi < 0.12 else "Loyalist")
+
+def hhi_of(ms):
+    if ms.empty: return 0.0, "no data"
+    hhi = float(((ms / ms.sum())**2).sum())
+    return hhi, loyalty(hhi)
+
+# ------------------------------------------------------------
+# SQL engine: one query per metric against daily_rollup
+# ------------------------------------------------------------
+def monthly_hours(con):
+    return q(con, """
+        SELECT printf('%d-%02d', month / 100, month % 100) AS month,
+               SUM(ms)/3600000.0 AS hours
+        FROM daily_rollup GROUP BY daily_rollup.month ORDER BY daily_rollup.month;
     """)
-    if df.empty: return
-    plt.figure(figsize=(10,3))
-    plt.plot(df["month"], df["hours"], marker="o")
-    plt.xticks(rotation=45, ha="right")
-    plt.xlabel("Month"); plt.ylabel("Hours"); plt.title("Monthly Listening Hours")
-    plt.tight_layout(); plt.savefig(IMG_DIR/"monthly_hours.png", dpi=150); plt.close()
 
-def plot_by_hour(con):
-    df = q(con, """
-        SELECT CAST(strftime('%H', endTime) AS INTEGER) AS hour,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY hour ORDER BY hour;
+def hourly_hours(con):
+    return q(con, """
+        SELECT hour, SUM(ms)/3600000.0 AS hours
+        FROM daily_rollup GROUP BY hour ORDER BY hour;
     """)
-    if df.empty: return [], ""
-    plt.figure(figsize=(8,3))
-    plt.plot(df["hour"], df["hours"], marker="o")
-    plt.xlabel("Hour"); plt.ylabel("Hours"); plt.title("By Hour of Day")
-    plt.tight_layout(); plt.savefig(IMG_DIR/"by_hour.png", dpi=150); plt.close()
-    top = df.sort_values("hours", ascending=False).head(3)["hour"].tolist()
-    label = ", ".join(f"{h}h" for h in top)
-    return top, label
 
-def plot_by_weekday(con):
-    df = q(con, """
-        SELECT CASE strftime('%w', endTime)
-            WHEN '0' THEN 'Sun' WHEN '1' THEN 'Mon' WHEN '2' THEN 'Tue'
-            WHEN '3' THEN 'Wed' WHEN '4' THEN 'Thu' WHEN '5' THEN 'Fri'
-            WHEN '6' THEN 'Sat' END AS weekday,
-            SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY strftime('%w', endTime) ORDER BY strftime('%w', endTime);
+def weekday_hours(con):
+    return q(con, """
+        SELECT CASE weekday
+            WHEN 0 THEN 'Sun' WHEN 1 THEN 'Mon' WHEN 2 THEN 'Tue'
+            WHEN 3 THEN 'Wed' WHEN 4 THEN 'Thu' WHEN 5 THEN 'Fri'
+            WHEN 6 THEN 'Sat' END AS weekday,
+            SUM(ms)/3600000.0 AS hours
+        FROM daily_rollup GROUP BY daily_rollup.weekday ORDER BY daily_rollup.weekday;
     """)
-    if df.empty: return ""
-    plt.figure(figsize=(7,3))
-    plt.bar(df["weekday"], df["hours"])
-    plt.xlabel("Weekday"); plt.ylabel("Hours"); plt.title("By Weekday")
-    plt.tight_layout(); plt.savefig(IMG_DIR/"by_weekday.png", dpi=150); plt.close()
-    top = df.sort_values("hours", ascending=False).head(3)["weekday"].tolist()
-    return ", ".join(top)
 
 def compute_hhi(con):
-    df = q(con, "SELECT artistName, SUM(msPlayed) AS ms FROM listens GROUP BY artistName")
-    if df.empty: return 0.0, "no data"
-    total = df["ms"].sum()
-    shares = (df["ms"] / total)**2
-    hhi = shares.sum()
-    label = "Explorer" if hhi < 0.07 else ("Balanced" if hhi < 0.12 else "Loyalist")
-    return float(hhi), label
+    df = q(con, "SELECT artist_id, SUM(ms) AS ms FROM daily_rollup GROUP BY artist_id")
+    return hhi_of(df["ms"])
 
 def top_artists(con):
     return q(con, """
-        SELECT artistName, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened, COUNT(*) AS plays
-        FROM listens GROUP BY artistName ORDER BY hours_listened DESC, plays DESC LIMIT 10;
+        WITH per_artist AS (SELECT artist_id, SUM(ms) AS ms, SUM(plays) AS plays FROM daily_rollup GROUP BY artist_id)
+        SELECT a.artistName, ROUND(ms/3600000.0, 2) AS hours_listened, plays
+        FROM per_artist JOIN artists a USING(artist_id)
+        ORDER BY hours_listened DESC, plays DESC, a.artistName LIMIT 10;
     """)
 
 def top_tracks(con):
     return q(con, """
-        SELECT trackName, artistName, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened, COUNT(*) AS plays
-        FROM listens GROUP BY trackName, artistName ORDER BY hours_listened DESC, plays DESC LIMIT 10;
+        WITH per_track AS (SELECT track_id, SUM(ms) AS ms, SUM(plays) AS plays FROM daily_rollup GROUP BY track_id)
+        SELECT t.trackName, a.artistName, ROUND(ms/3600000.0, 2) AS hours_listened, plays
+        FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id)
+        ORDER BY hours_listened DESC, plays DESC, t.trackName, a.artistName LIMIT 10;
     """)
 
 def repeat_metrics(con):
-    a = q(con, "SELECT COUNT(*) AS plays FROM listens").iloc[0]["plays"]
-    b = q(con, "SELECT COUNT(DISTINCT trackName) AS uniq FROM listens").iloc[0]["uniq"]
+    a = q(con, "SELECT SUM(plays) AS plays FROM daily_rollup").iloc[0]["plays"]
+    b = q(con, "SELECT COUNT(DISTINCT trackName) AS uniq FROM tracks").iloc[0]["uniq"]
     avg = round(a / b, 2) if b else 0
     return a, b, avg
 
 def skip_metrics(con):
     df = q(con, """
         SELECT
-          COUNT(*) AS total_plays,
-          SUM(CASE WHEN msPlayed < 30000 THEN 1 ELSE 0 END) AS plays_lt_30s,
-          ROUND(100.0 * SUM(CASE WHEN msPlayed < 30000 THEN 1 ELSE 0 END) / COUNT(*), 1) AS pct_lt_30s,
-          SUM(CASE WHEN msPlayed < 60000 THEN 1 ELSE 0 END) AS plays_lt_60s,
-          ROUND(100.0 * SUM(CASE WHEN msPlayed < 60000 THEN 1 ELSE 0 END) / COUNT(*), 1) AS pct_lt_60s
-        FROM listens;
+          SUM(plays) AS total_plays,
+          SUM(plays_lt_30s) AS plays_lt_30s,
+          ROUND(100.0 * SUM(plays_lt_30s) / SUM(plays), 1) AS pct_lt_30s,
+          SUM(plays_lt_60s) AS plays_lt_60s,
+          ROUND(100.0 * SUM(plays_lt_60s) / SUM(plays), 1) AS pct_lt_60s
+        FROM daily_rollup;
     """).iloc[0]
     return float(df["pct_lt_30s"]), float(df["pct_lt_60s"])
 
+def top_replays(con):
+    return q(con, """
+        WITH per_track AS (SELECT track_id, SUM(plays) AS play_sessions, SUM(ms) AS ms FROM daily_rollup GROUP BY track_id HAVING play_sessions >= 3)
+        SELECT t.trackName, a.artistName, play_sessions, ROUND(ms/60000.0,1) AS minutes_listened
+        FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id)
+        ORDER BY play_sessions DESC, minutes_listened DESC, t.trackName, a.artistName LIMIT 20;""")
+
 def binges(con):
     return q(con, """
         WITH month_artist AS (
-          SELECT strftime('%Y-%m', endTime) AS month, artistName, SUM(msPlayed) AS ms_month_artist
-          FROM listens GROUP BY month, artistName
+          SELECT month, artist_id, SUM(ms) AS ms_month_artist
+          FROM daily_rollup GROUP BY month, artist_id
         ),
         month_total AS (
           SELECT month, SUM(ms_month_artist) AS ms_month_total FROM month_artist GROUP BY month
         )
-        SELECT m.month, m.artistName, ROUND(100.0 * m.ms_month_artist / t.ms_month_total, 1) AS month_share_pct
+        SELECT printf('%d-%02d', m.month / 100, m.month % 100) AS month, a.artistName,
+               ROUND(100.0 * m.ms_month_artist / t.ms_month_total, 1) AS month_share_pct
         FROM month_artist m
         JOIN month_total t USING(month)
+        JOIN artists a USING(artist_id)
         WHERE m.ms_month_artist >= 30*60*1000
-        ORDER BY m.month, month_share_pct DESC;
+        ORDER BY m.month, month_share_pct DESC, a.artistName;
     """)
 
 def discovery(con):
-    df = q(con, """
+    return q(con, """
         WITH first_seen AS (
-          SELECT artistName, MIN(date(endTime)) AS first_date FROM listens GROUP BY artistName
+          SELECT artist_id, MIN(day) AS first_day FROM daily_rollup GROUP BY artist_id
         ),
-        calendar AS (SELECT DISTINCT date(endTime) AS d FROM listens),
+        calendar AS (SELECT DISTINCT day AS d FROM daily_rollup),
         daily AS (
-          SELECT c.d, COALESCE(SUM(CASE WHEN f.first_date = c.d THEN 1 ELSE 0 END),0) AS new_artists
-          FROM calendar c LEFT JOIN first_seen f ON f.first_date = c.d
+          SELECT c.d, COALESCE(SUM(CASE WHEN f.first_day = c.d THEN 1 ELSE 0 END),0) AS new_artists
+          FROM calendar c LEFT JOIN first_seen f ON f.first_day = c.d
           GROUP BY c.d
         )
-        SELECT d AS date, new_artists,
+        SELECT date(d * 86400, 'unixepoch') AS date, new_artists,
                SUM(new_artists) OVER (ORDER BY d ROWS UNBOUNDED PRECEDING) AS cumulative_artists
-        FROM daily ORDER BY date;
+        FROM daily ORDER BY d;
     """)
-    if df.empty: return df
-    plt.figure(figsize=(10,3))
-    plt.plot(df["date"], df["cumulative_artists"], marker="o")
-    plt.xlabel("Date"); plt.ylabel("Cumulative Artists"); plt.title("Discovery Over Time")
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout(); plt.savefig(IMG_DIR/"discovery_cumulative.png", dpi=150); plt.close()
-    return df
 
 def date_range(con):
-    df = q(con, "SELECT MIN(date(endTime)) AS start, MAX(date(endTime)) AS end FROM listens")
+    df = q(con, "SELECT date(MIN(day) * 86400, 'unixepoch') AS start, date(MAX(day) * 86400, 'unixepoch') AS end FROM daily_rollup")
     if df.empty: return "n/a"
     s,e = df.iloc[0]["start"], df.iloc[0]["end"]
     return f"{s} → {e}"
@@ -149,30 +151,267 @@ def date_range(con):
 def guilty_pleasures(con):
     # many sessions but low total minutes: >=5 sessions AND total minutes < 12
     return q(con, """
-        SELECT trackName, artistName,
-               COUNT(*) AS play_sessions,
-               ROUND(SUM(msPlayed)/60000.0, 1) AS minutes_total
-        FROM listens
-        GROUP BY trackName, artistName
-        HAVING play_sessions >= 5 AND SUM(msPlayed) < 12*60000
-        ORDER BY play_sessions DESC, minutes_total ASC
+        WITH per_track AS (
+            SELECT track_id, SUM(plays) AS play_sessions, SUM(ms) AS ms
+            FROM daily_rollup
+            GROUP BY track_id
+            HAVING play_sessions >= 5 AND SUM(ms) < 12*60000
+        )
+        SELECT t.trackName, a.artistName, play_sessions, ROUND(ms/60000.0, 1) AS minutes_total
+        FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id)
+        ORDER BY play_sessions DESC, minutes_total ASC, t.trackName, a.artistName
         LIMIT 20;
     """)
 
 def what_if_drop_top(con):
-    top = q(con, "SELECT artistName, SUM(msPlayed) AS ms FROM listens GROUP BY artistName ORDER BY ms DESC LIMIT 1;")
+    top = q(con, """
+        WITH per_artist AS (SELECT artist_id, SUM(ms) AS ms FROM daily_rollup GROUP BY artist_id)
+        SELECT a.artistName, ms FROM per_artist JOIN artists a USING(artist_id)
+        ORDER BY ms DESC, a.artistName LIMIT 2;
+    """)
     if top.empty: return "n/a","n/a"
     top_artist = top.iloc[0]["artistName"]
-    newtop = q(con, """
-        WITH filtered AS (
-            SELECT * FROM listens WHERE artistName != (SELECT artistName FROM (SELECT artistName, SUM(msPlayed) AS ms FROM listens GROUP BY artistName ORDER BY ms DESC LIMIT 1))
-        )
-        SELECT artistName, ROUND(SUM(msPlayed)/3600000.0,2) AS hours
-        FROM filtered GROUP BY artistName ORDER BY hours DESC LIMIT 1;
-    """)
+    # dropping #1 leaves every other artist's hours unchanged, so the new #1 is the old #2
+    newtop = top.iloc[1:]
     nt = newtop.iloc[0]["artistName"] if not newtop.empty else "n/a"
     return top_artist, nt
 
+def artist_hours(con):
+    return q(con, """
+        WITH per_artist AS (SELECT artist_id, SUM(ms) AS ms FROM daily_rollup GROUP BY artist_id)
+        SELECT a.artistName, ms/3600000.0 AS hours FROM per_artist JOIN artists a USING(artist_id)
+    """)
+
+def session_metrics(con):
+    # shared by both engines: the sessions table is already one row per session
+    gap = con.execute("SELECT value FROM settings WHERE key = 'session_gap_min'").fetchone()
+    s = summarize(q(con, "SELECT start_min, end_min, plays, ms, artists FROM sessions"))
+    return dict(s, gap=int(gap[0]) if gap else SESSION_GAP_MIN,
+                lengths=pd.DataFrame(s["lengths"]), diversity=pd.DataFrame(s["diversity"]))
+
+def streak_metrics(con, pairs=None, top=10):
+    # RLE over the distinct (artist, day) pairs of daily_rollup, sorted; the scan engine
+    # passes the pairs it collected, the sql engine queries them
+    if pairs is None:
+        pairs = np.array(con.execute("SELECT DISTINCT artist_id, day FROM daily_rollup ORDER BY artist_id, day").fetchall(),
+                         dtype=np.int64).reshape(-1, 2)
+    cal = calendar_streaks(np.unique(pairs[:, 1]))
+    artist, first, length = longest_streaks(pairs[:, 0], pairs[:, 1])
+    names = q(con, "SELECT artist_id, artistName FROM artists").set_index("artist_id")["artistName"]
+    df = pd.DataFrame({"artistName": names.reindex(artist).to_numpy(), "streak_days": length, "first": first})
+    df = top_streaks(df, top)
+    df["from"] = [iso_date(d) for d in df["first"]]
+    df["to"] = [iso_date(d + n - 1) for d, n in zip(df.pop("first"), df["streak_days"])]
+    span = lambda r: f"{r[1]} days ({iso_date(r[0])} → {iso_date(r[0] + r[1] - 1)})" if r else "n/a"
+    return dict(active_days=cal["active_days"], span_days=cal["span_days"],
+                longest_streak=span(cal["longest_streak"]), longest_gap=span(cal["longest_gap"]),
+                artists=df.reset_index(drop=True))
+
+def sql_metrics(con):
+    totals = q(con, "SELECT SUM(plays) AS plays, SUM(ms)/3600000.0 AS hours FROM daily_rollup").iloc[0]
+    uniq = q(con, "SELECT (SELECT COUNT(*) FROM artists) AS artists, (SELECT COUNT(DISTINCT trackName) FROM tracks) AS tracks").iloc[0]
+    pct30, pct60 = skip_metrics(con)
+    top_artist, new_top = what_if_drop_top(con)
+    return dict(
+        date_range = date_range(con),
+        total_plays = int(totals["plays"]), total_hours = float(totals["hours"]),
+        unique_artists = int(uniq["artists"]), unique_tracks = int(uniq["tracks"]),
+        top_artists = top_artists(con), top_tracks = top_tracks(con),
+        hhi = compute_hhi(con),
+        by_hour = hourly_hours(con), by_weekday = weekday_hours(con), monthly = monthly_hours(con),
+        pct_lt_30s = pct30, pct_lt_60s = pct60,
+        avg_plays_per_track = repeat_metrics(con)[2],
+        replays = top_replays(con), binges = binges(con), discovery = discovery(con),
+        top_artist = top_artist, new_top = new_top,
+        guilty = guilty_pleasures(con),
+        artist_hours = artist_hours(con),
+        sessions = session_metrics(con),
+        streaks = streak_metrics(con),
+    )
+
+# ------------------------------------------------------------
+# Scan engine: read daily_rollup once, derive every metric from shared aggregates
+# ------------------------------------------------------------
+def epoch_month(day):
+    # days since 1970-01-01 -> months since 1970-01
+    return np.asarray(day, dtype="datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+def month_label(m):
+    # months since 1970-01 -> 'YYYY-MM'
+    return f"{1970 + m // 12}-{m % 12 + 1:02d}"
+
+def iso_date(day):
+    return str(np.datetime64(int(day), "D"))
+
+def scan_rollup(con, track_artist, n_artists, chunksize=SCAN_CHUNK):
+    # Single pass over daily_rollup. Every chunk is folded into dense arrays indexed by
+    # track, (month, artist), hour, weekday and day, plus the distinct (artist, day)
+    # pairs for streaks; all report metrics derive from these.
+    lo, hi = con.execute("SELECT MIN(day), MAX(day) FROM daily_rollup").fetchone()
+    if lo is None:
+        return None
+    m0, n_tracks = epoch_month(lo), len(track_artist)
+    n_months = epoch_month(hi) - m0 + 1
+    agg = dict(
+        lo = lo, m0 = m0,
+        track = np.zeros((4, n_tracks)),                 # plays, ms, plays <30s, plays <60s
+        month_artist = np.zeros((2, n_months * n_artists)),  # plays, ms
+        hour = np.zeros((2, 24)), weekday = np.zeros((2, 7)),
+        first_day = np.full(n_artists, np.iinfo(np.int64).max),
+        seen = np.zeros(hi - lo + 1, dtype=bool),
+    )
+    span, artist_days = hi - lo + 1, []  # artist * span + (day - lo), unique per chunk
+    # bincount sums in float64, exact for integer totals below 2**53
+    cur = con.execute("SELECT day, hour, track_id, plays, ms, plays_lt_30s, plays_lt_60s FROM daily_rollup")
+    while True:
+        rows = cur.fetchmany(chunksize)
+        if not rows:
+            break
+        day, hour, tid, plays, ms, lt30, lt60 = np.array(rows, dtype=np.int64).T
+        artist = track_artist[tid]
+        ma = (epoch_month(day) - m0) * n_artists + artist
+        wd = (day + 4) % 7  # 1970-01-01 was a Thursday, 0 = Sunday
+        for i, w in enumerate((plays, ms, lt30, lt60)):
+            agg["track"][i] += np.bincount(tid, weights=w, minlength=n_tracks)
+        for i, w in enumerate((plays, ms)):
+            agg["month_artist"][i] += np.bincount(ma, weights=w, minlength=n_months * n_artists)
+            agg["hour"][i] += np.bincount(hour, weights=w, minlength=24)
+            agg["weekday"][i] += np.bincount(wd, weights=w, minlength=7)
+        np.minimum.at(agg["first_day"], artist, day)
+        agg["seen"][day - lo] = True
+        artist_days.append(np.unique(artist * span + (day - lo)))
+    for k in ("track", "month_artist", "hour", "weekday"):
+        agg[k] = agg[k].astype(np.int64)
+    agg["month_artist"] = agg["month_artist"].reshape(2, n_months, n_artists)
+    ad = np.unique(np.concatenate(artist_days))
+    agg["artist_days"] = np.column_stack([ad // span, ad % span + lo])
+    return agg
+
+def scan_metrics(con):
+    artists = q(con, "SELECT artist_id, artistName FROM artists").set_index("artist_id")["artistName"]
+    tracks = q(con, "SELECT track_id, artist_id, trackName FROM tracks").set_index("track_id")
+    n_artists = int(artists.index.max()) + 1 if len(artists) else 1
+    track_artist = np.zeros(int(tracks.index.max()) + 1 if len(tracks) else 1, dtype=np.int64)
+    track_artist[tracks.index.to_numpy()] = tracks["artist_id"].to_numpy()
+    agg = scan_rollup(con, track_artist, n_artists)
+    if agg is None:
+        raise SystemExit("daily_rollup is empty - run src/import_data.py first.")
+
+    plays, ms, lt30, lt60 = agg["track"]
+    pt = tracks.assign(plays=plays[tracks.index], ms=ms[tracks.index])
+    pt = pt[pt["plays"] > 0].copy()
+    pt["artistName"] = pt["artist_id"].map(artists)
+    ma_plays, ma_ms = agg["month_artist"]
+    per_artist = pd.DataFrame({"ms": ma_ms.sum(axis=0), "plays": ma_plays.sum(axis=0)})
+    per_artist = per_artist[per_artist["plays"] > 0].copy()
+    per_artist["artistName"] = per_artist.index.map(artists)
+    total_plays, total_ms = int(plays.sum()), int(ms.sum())
+
+    ta = per_artist.assign(hours_listened=sql_round(per_artist["ms"] / 3600000.0, 2))
+    ta = ta.sort_values(["hours_listened", "plays", "artistName"], ascending=[False, False, True])
+    tt = pt.assign(hours_listened=sql_round(pt["ms"] / 3600000.0, 2))
+    tt = tt.sort_values(["hours_listened", "plays", "trackName", "artistName"], ascending=[False, False, True, True])
+
+    rep = pt[pt["plays"] >= 3].rename(columns={"plays": "play_sessions"})
+    rep = rep.assign(minutes_listened=sql_round(rep["ms"] / 60000.0, 1))
+    rep = rep.sort_values(["play_sessions", "minutes_listened", "trackName", "artistName"], ascending=[False, False, True, True])
+    gp = pt[(pt["plays"] >= 5) & (pt["ms"] < 12*60000)].rename(columns={"plays": "play_sessions"})
+    gp = gp.assign(minutes_total=sql_round(gp["ms"] / 60000.0, 1))
+    gp = gp.sort_values(["play_sessions", "minutes_total", "trackName", "artistName"], ascending=[False, True, True, True])
+
+    month_plays, month_ms = ma_plays.sum(axis=1), ma_ms.sum(axis=1)
+    mi, ai = np.nonzero(ma_ms >= 30*60*1000)
+    bg = pd.DataFrame({"m": mi, "artistName": artists.reindex(ai).to_numpy(),
+                       "month_share_pct": sql_round(pd.Series(100.0 * ma_ms[mi, ai] / month_ms[mi]), 1)})
+    bg = bg.sort_values(["m", "month_share_pct", "artistName"], ascending=[True, False, True])
+    bg.insert(0, "month", [month_label(agg["m0"] + m) for m in bg.pop("m")])
+    months = np.flatnonzero(month_plays)
+
+    days = np.flatnonzero(agg["seen"])
+    first = agg["first_day"][per_artist.index.to_numpy()] - agg["lo"]
+    new = np.bincount(first, minlength=len(agg["seen"]))[days]
+    disc = pd.DataFrame({"date": [iso_date(agg["lo"] + d) for d in days], "new_artists": new, "cumulative_artists": np.cumsum(new)})
+
+    (h_plays, h_ms), (w_plays, w_ms) = agg["hour"], agg["weekday"]
+    hours, wdays = np.flatnonzero(h_plays), np.flatnonzero(w_plays)
+    ranked = per_artist.sort_values(["ms", "artistName"], ascending=[False, True])["artistName"].tolist()
+    pct = lambda n: sql_round(100.0 * n / total_plays, 1)
+    return dict(
+        date_range = f"{iso_date(agg['lo'] + days[0])} → {iso_date(agg['lo'] + days[-1])}",
+        total_plays = total_plays, total_hours = total_ms / 3600000.0,
+        unique_artists = len(artists), unique_tracks = int(tracks["trackName"].nunique()),
+        top_artists = ta[["artistName", "hours_listened", "plays"]].head(10).reset_index(drop=True),
+        top_tracks = tt[["trackName", "artistName", "hours_listened", "plays"]].head(10).reset_index(drop=True),
+        hhi = hhi_of(per_artist["ms"]),
+        by_hour = pd.DataFrame({"hour": hours, "hours": h_ms[hours] / 3600000.0}),
+        by_weekday = pd.DataFrame({"weekday": [WEEKDAYS[w] for w in wdays], "hours": w_ms[wdays] / 3600000.0}),
+        monthly = pd.DataFrame({"month": [month_label(agg["m0"] + m) for m in months], "hours": month_ms[months] / 3600000.0}),
+        pct_lt_30s = pct(lt30.sum()), pct_lt_60s = pct(lt60.sum()),
+        avg_plays_per_track = round(np.int64(total_plays) / tracks["trackName"].nunique(), 2),
+        replays = rep[["trackName", "artistName", "play_sessions", "minutes_listened"]].head(20).reset_index(drop=True),
+        binges = bg.reset_index(drop=True),
+        discovery = disc,
+        top_artist = ranked[0], new_top = ranked[1] if len(ranked) > 1 else "n/a",
+        guilty = gp[["trackName", "artistName", "play_sessions", "minutes_total"]].head(20).reset_index(drop=True),
+        artist_hours = pd.DataFrame({"artistName": per_artist["artistName"].to_numpy(), "hours": per_artist["ms"].to_numpy() / 3600000.0}),
+        sessions = session_metrics(con),
+        streaks = streak_metrics(con, agg["artist_days"]),
+    )
+
+ENGINES = {"scan": scan_metrics, "sql": sql_metrics}
+
+# ------------------------------------------------------------
+# Charts & template
+# ------------------------------------------------------------
+def plot_monthly(df):
+    if df.empty: return
+    plt.figure(figsize=(10,3))
+    plt.plot(df["month"], df["hours"], marker="o")
+    plt.xticks(rotation=45, ha="right")
+    plt.xlabel("Month"); plt.ylabel("Hours"); plt.title("Monthly Listening Hours")
+    plt.tight_layout(); plt.savefig(IMG_DIR/"monthly_hours.png", dpi=150); plt.close()
+
+def plot_by_hour(df):
+    if df.empty: return
+    plt.figure(figsize=(8,3))
+    plt.plot(df["hour"], df["hours"], marker="o")
+    plt.xlabel("Hour"); plt.ylabel("Hours"); plt.title("By Hour of Day")
+    plt.tight_layout(); plt.savefig(IMG_DIR/"by_hour.png", dpi=150); plt.close()
+
+def plot_by_weekday(df):
+    if df.empty: return
+    plt.figure(figsize=(7,3))
+    plt.bar(df["weekday"], df["hours"])
+    plt.xlabel("Weekday"); plt.ylabel("Hours"); plt.title("By Weekday")
+    plt.tight_layout(); plt.savefig(IMG_DIR/"by_weekday.png", dpi=150); plt.close()
+
+def plot_discovery(df):
+    if df.empty: return
+    plt.figure(figsize=(10,3))
+    plt.plot(df["date"], df["cumulative_artists"], marker="o")
+    plt.xlabel("Date"); plt.ylabel("Cumulative Artists"); plt.title("Discovery Over Time")
+    plt.xticks(rotation=45, ha="right")
+    plt.tight_layout(); plt.savefig(IMG_DIR/"discovery_cumulative.png", dpi=150); plt.close()
+
+def plot_session_lengths(s):
+    if not s["sessions"]: return
+    plt.figure(figsize=(7,3))
+    plt.bar(s["lengths"]["bucket"], s["lengths"]["sessions"])
+    plt.xlabel("Session length"); plt.ylabel("Sessions"); plt.title("Listening Sessions by Length")
+    plt.tight_layout(); plt.savefig(IMG_DIR/"session_lengths.png", dpi=150); plt.close()
+
+# (metrics key, plot function, image file)
+IMAGES = [
+    ("monthly", plot_monthly, "monthly_hours.png"),
+    ("by_hour", plot_by_hour, "by_hour.png"),
+    ("by_weekday", plot_by_weekday, "by_weekday.png"),
+    ("discovery", plot_discovery, "discovery_cumulative.png"),
+    ("sessions", plot_session_lengths, "session_lengths.png"),
+]
+
+def top3(df, col):
+    return df.sort_values("hours", ascending=False).head(3)[col].tolist()
+
 def optional_genres():
     p = CACHE_DIR / "artist_genres.csv"
     if not p.exists(): return False, None
@@ -181,9 +420,8 @@ def optional_genres():
     df["genres"] = df["genres"].fillna("")
     return True, df
 
-def top_genres(con, genres_df):
+def top_genres(hrs, genres_df):
     # map artist hours to genres (equal split among listed genres)
-    hrs = q(con, "SELECT artistName, SUM(msPlayed)/3600000.0 AS hours FROM listens GROUP BY artistName")
     m = hrs.merge(genres_df, on="artistName", how="left")
     rows = []
     for _, r in m.iterrows():
@@ -198,68 +436,91 @@ def top_genres(con, genres_df):
     top = long.groupby("genre", as_index=False)["hours"].sum().sort_values("hours", ascending=False).head(15)
     return top
 
-def main():
-    if not DB.exists():
-        raise SystemExit("Missing db/spotify.db. Copy your database into db/.")
-    con = sqlite3.connect(DB)
-
-    # Key numbers
-    totals = (pd.read_sql_query("SELECT COUNT(*) AS plays, SUM(msPlayed)/3600000.0 AS hours FROM listens", con)).iloc[0]
-    total_plays, total_hours = int(totals["plays"]), float(totals["hours"])
-    uniq = (pd.read_sql_query("SELECT COUNT(DISTINCT artistName) AS artists, COUNT(DISTINCT trackName) AS tracks FROM listens", con)).iloc[0]
-    unique_artists, unique_tracks = int(uniq["artists"]), int(uniq["tracks"])
-
-    # Sections & charts
-    topA = top_artists(con)
-    topT = top_tracks(con)
-    hhi, loyalty_label = compute_hhi(con)
-    top_hours_list, peak_hours_label = plot_by_hour(con)
-    top_weekdays_label = plot_by_weekday(con)
-    plot_monthly(con)
-    pct30, pct60 = skip_metrics(con)
-    plays, dtracks, avg = repeat_metrics(con)
-    replays = pd.read_sql_query("""
-        SELECT trackName, artistName, COUNT(*) AS play_sessions, ROUND(SUM(msPlayed)/60000.0,1) AS minutes_listened
-        FROM listens GROUP BY trackName, artistName
-        HAVING play_sessions >= 3 ORDER BY play_sessions DESC, minutes_listened DESC LIMIT 20;""", con)
-    binges_df = binges(con)
-    disc = discovery(con)
-    top_artist, new_top = what_if_drop_top(con)
+def render(m):
+    hhi, loyalty_label = m["hhi"]
+    peak_hours_label = ", ".join(f"{h}h" for h in top3(m["by_hour"], "hour"))
+    top_weekdays_label = ", ".join(top3(m["by_weekday"], "weekday"))
 
     # Optional genres
     genre_available, gdf = optional_genres()
-    if genre_available:
-        topG = top_genres(con, gdf)
-        top_genres_table = fmt_table(topG, 15)
-    else:
-        top_genres_table = ""
+    top_genres_table = fmt_table(top_genres(m["artist_hours"], gdf), 15) if genre_available else ""
 
     # Render template
-    template_path = ROOT / "src" / "report_template.md.j2"
-    templ = Template(template_path.read_text(encoding="utf-8"))
-    md = templ.render(
-        date_range = date_range(con),
-        total_hours = total_hours,
-        total_plays = total_plays,
-        unique_artists = unique_artists,
-        unique_tracks = unique_tracks,
-        top_artists_table = fmt_table(topA),
-        top_tracks_table = fmt_table(topT),
+    templ = Template(TEMPLATE.read_text(encoding="utf-8"))
+    return templ.render(
+        date_range = m["date_range"],
+        total_hours = m["total_hours"],
+        total_plays = m["total_plays"],
+        unique_artists = m["unique_artists"],
+        unique_tracks = m["unique_tracks"],
+        top_artists_table = fmt_table(m["top_artists"]),
+        top_tracks_table = fmt_table(m["top_tracks"]),
         hhi = hhi,
         loyalty_label = loyalty_label,
         peak_hours = peak_hours_label,
         top_weekdays = top_weekdays_label,
-        pct_lt_30s = pct30, pct_lt_60s = pct60,
-        avg_plays_per_track = avg,
-        top_replays_table = fmt_table(replays),
-        binges_table = fmt_table(binges_df, 20),
-        top_artist_name = top_artist, new_top_artist = new_top,
+        pct_lt_30s = m["pct_lt_30s"], pct_lt_60s = m["pct_lt_60s"],
+        avg_plays_per_track = m["avg_plays_per_track"],
+        top_replays_table = fmt_table(m["replays"]),
+        binges_table = fmt_table(m["binges"], 20),
+        top_artist_name = m["top_artist"], new_top_artist = m["new_top"],
         genre_available = genre_available,
         top_genres_table = top_genres_table,
-        guilty_table = fmt_table(guilty_pleasures(con), 20)
+        guilty_table = fmt_table(m["guilty"], 20),
+        sessions = m["sessions"],
+        session_diversity_table = fmt_table(m["sessions"]["diversity"]),
+        streaks = m["streaks"],
+        artist_streaks_table = fmt_table(m["streaks"]["artists"]),
     )
-    (OUT_DIR/"Spotify_Wrapped_Report.md").write_text(md, encoding="utf-8")
-    print("Report written to outputs/Spotify_Wrapped_Report.md")
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Render outputs/Spotify_Wrapped_Report.md from db/spotify.db")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="scan",
+                    help="scan: one pass over daily_rollup (default); sql: one query per metric")
+    ap.add_argument("--force", action="store_true", help="rebuild the report and images, ignoring the manifest and cache/charts")
+    ap.add_argument("--refresh-cache", action="store_true", help="store the redrawn images in cache/charts even under --force")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not DB.exists():
+        raise SystemExit("Missing db/spotify.db. Copy your database into db/.")
+    # images depend on the DB content and CODE; the report also on the template and genres
+    # (both engines produce the same metrics, so the engine is not an input)
+    manifest = Manifest(OUT_DIR, args.force)
+    base = {"db": db_fingerprint(DB), "code": [file_hash(p) for p in CODE]}
+    report, report_inputs = OUT_DIR/"Spotify_Wrapped_Report.md", {
+        **base, "template": file_hash(TEMPLATE), "genres": file_hash(CACHE_DIR / "artist_genres.csv")}
+    images = [(key, plot, IMG_DIR/name) for key, plot, name in IMAGES if manifest.stale(IMG_DIR/name, base)]
+    write_report = manifest.stale(report, report_inputs)
+    if not images and not write_report:
+        print("outputs/Spotify_Wrapped_Report.md and report images are up to date")
+        return
+    con = sqlite3.connect(DB)
+    t0 = time.perf_counter()
+    metrics = ENGINES[args.engine](con)
+    con.close()
+    t1 = time.perf_counter()
+    # an image whose plotted data and plot function match a cached PNG is copied, not drawn
+    cache, drawn = ChartCache(), 0
+    for key, plot, path in images:
+        ckey = content_hash(code_hash(plot), metrics[key])
+        if not args.force and cache.fetch(ckey, path):
+            manifest.record(path, base)
+            continue
+        plot(metrics[key])
+        drawn += 1
+        if path.exists():
+            if not args.force or args.refresh_cache:
+                cache.store(ckey, path)
+            manifest.record(path, base)
+    if write_report:
+        report.write_text(render(metrics), encoding="utf-8")
+        manifest.record(report, report_inputs)
+    manifest.save()
+    print(f"Report {'written to' if write_report else 'up to date in'} outputs/Spotify_Wrapped_Report.md "
+          f"({args.engine} engine: metrics {t1 - t0:.2f}s, render {time.perf_counter() - t1:.2f}s, "
+          f"{drawn} of {len(IMAGES)} images redrawn, {cache.hits} from cache/charts)")
 
 if __name__ == "__main__":
     main()
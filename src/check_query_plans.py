@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Regression check: EXPLAIN QUERY PLAN every query the project ships and fail
+# if one of them reads the plays fact table without a covering index, or scans a
+# day-keyed table it filters by day.
+#
+# Queries are collected from sql/*.sql and from every SQL string literal
+# (including f-strings) in src/*.py and the Streamlit app. They are planned
+# against a small database built by import_data.py from a synthetic export.
+import ast, re, pathlib, tempfile, shutil, sqlite3
+import import_data
+from synth_history import write_history
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SOURCES = sorted((ROOT / "src").glob("*.py")) + [ROOT / "streamlit-spotify-insights" / "app.py"]
+
+# Values substituted for {placeholders} in f-string queries, keyed by the
+# expression text. An unknown placeholder fails the check so it gets registered.
+PLACEHOLDERS = {
+    "clause": "day BETWEEN ? AND ?",
+    "ids": "1,2,3",
+}
+
+# A query that intentionally reads every row of plays says so with this SQL comment
+FULL_SCAN_MARK = "-- full scan"
+
+FACT_TABLES = {"plays"}
+# tables keyed (or indexed) on day: a query filtering on day must SEARCH them, since
+# even a covering index scan reads every row once the filter can't use the key
+DAY_TABLES = {"daily_rollup", "duration_rollup", "sessions"}
+DAY_FILTER = re.compile(r"\bday\b(\s*[-+*/]\s*\w+)*\s*(BETWEEN\b|IN\b|[<>=])", re.I)
+SQL_START = re.compile(r"^\s*(SELECT|WITH)\b", re.I)
+
+def sql_literals(path: pathlib.Path):
+    # Yield (line, sql) for every string literal in a Python file that looks like a query
+    tree = ast.parse(path.read_text(encoding="utf-8"), str(path))
+    fragments = {id(v) for n in ast.walk(tree) if isinstance(n, ast.JoinedStr) for v in n.values}
+    for node in ast.walk(tree):
+        if id(node) in fragments:
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            text = node.value
+        elif isinstance(node, ast.JoinedStr):
+            parts, unknown = [], []
+            for v in node.values:
+                if isinstance(v, ast.Constant):
+                    parts.append(v.value)
+                else:
+                    expr = ast.unparse(v.value)
+                    if expr not in PLACEHOLDERS:
+                        unknown.append(expr)
+                    parts.append(PLACEHOLDERS.get(expr, ""))
+            text = "".join(parts)
+            if unknown and SQL_START.match(text):
+                raise SystemExit(f"{path.name}:{node.lineno}: unknown f-string placeholder {{{unknown[0]}}} "
+                                 "- add it to PLACEHOLDERS in check_query_plans.py")
+        else:
+            continue
+        if SQL_START.match(text):
+            yield node.lineno, text
+
+def shipped_queries():
+    for p in sorted((ROOT / "sql").glob("*.sql")):
+        yield f"sql/{p.name}", p.read_text(encoding="utf-8")
+    for p in SOURCES:
+        for line, text in sql_literals(p):
+            yield f"{p.relative_to(ROOT).as_posix()}:{line}", text
+
+def aliases(sql: str, tables: set):
+    names = set(tables)
+    for t in tables:
+        names.update(m.group(1) for m in re.finditer(rf"\b{t}\s+(?:AS\s+)?(\w+)", sql, re.I))
+    reserved = {"where", "group", "order", "join", "left", "inner", "on", "using", "limit", "having"}
+    return {n for n in names if n.lower() not in reserved}
+
+def plan(con, sql: str):
+    params = [0] * sql.count("?")
+    return [r[3] for r in con.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def build_db(tmp: pathlib.Path) -> pathlib.Path:
+    data = tmp / "data"
+    data.mkdir()
+    paths = write_history(data, 4000, rows_per_file=2000)
+    import_data.DB = tmp / "plans.db"
+    import_data.rebuild(paths, import_data.BATCH_SIZE)
+    con = sqlite3.connect(import_data.DB)
+    # only exists while import_data.upgrade_legacy() runs
+    con.execute("CREATE TABLE listens_legacy(endTime TEXT, artistName TEXT, trackName TEXT, msPlayed INT)")
+    con.commit()
+    con.close()
+    return import_data.DB
+
+def main():
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="spotify_plans_"))
+    failures, n = [], 0
+    try:
+        con = sqlite3.connect(build_db(tmp))
+        for where, sql in shipped_queries():
+            n += 1
+            try:
+                steps = plan(con, sql)
+            except sqlite3.Error as e:
+                failures.append(f"{where}: does not compile: {e}")
+                continue
+            fact = aliases(sql, FACT_TABLES)
+            by_day = aliases(sql, DAY_TABLES) if DAY_FILTER.search(sql) else set()
+            for step in steps:
+                m = re.match(r"SCAN (\w+)(.*)", step)
+                if not m or FULL_SCAN_MARK in sql:
+                    continue
+                if m.group(1) in fact and "COVERING INDEX" not in m.group(2) or m.group(1) in by_day:
+                    failures.append(f"{where}: {step}")
+        con.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"Checked {n} queries.")
+    if failures:
+        print("Queries scanning the fact table without a covering index, or a day-keyed table filtered by day:")
+        print("\n".join(f"  {f}" for f in failures))
+        raise SystemExit(1)
+    print("All query plans use covering indexes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Prefix sums over days of daily_rollup, so totals for any date range are two
+# array lookups instead of a GROUP BY. Built once per database by the dashboard.
+#
+# Row d of every cum_* array holds the totals of days [first, first + d), so the
+# range [lo, hi] is cum[hi - first + 1] - cum[lo - first].
+import json
+import numpy as np
+import pandas as pd
+from sqlite_compat import sql_round
+
+TOP_N = 200  # artists with their own cumulative arrays
+WEEKDAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+
+def cumulate(a):
+    return np.concatenate([np.zeros((1,) + a.shape[1:], dtype=a.dtype), np.cumsum(a, axis=0)])
+
+class DateCube:
+    def __init__(self, con, top_n: int = TOP_N):
+        first, last = con.execute("SELECT MIN(day), MAX(day) FROM daily_rollup").fetchone()
+        self.first, self.days = first, 0 if first is None else last - first + 1
+        # (day, weekday, hour) ms and plays; each day only fills its own weekday
+        ms = np.zeros((self.days, 7, 24), dtype=np.int64)
+        plays = np.zeros_like(ms)
+        counts = np.zeros((self.days, 3), dtype=np.int64)  # plays, <30s, <60s
+        rows = np.array(con.execute("""
+            SELECT day, weekday, hour, SUM(ms), SUM(plays), SUM(plays_lt_30s), SUM(plays_lt_60s)
+            FROM daily_rollup GROUP BY day, hour
+        """).fetchall(), dtype=np.int64).reshape(-1, 7)
+        d = rows[:, 0] - (first or 0)
+        ms[d, rows[:, 1], rows[:, 2]] = rows[:, 3]
+        plays[d, rows[:, 1], rows[:, 2]] = rows[:, 4]
+        np.add.at(counts, d, rows[:, 4:7])
+        self.cum_ms, self.cum_plays, self.cum_counts = cumulate(ms), cumulate(plays), cumulate(counts)
+
+        # the top_n artists of the whole history; any other artist has at most
+        # bound_ms in any range, which is what makes a top-k from the cube provably exact
+        top = con.execute("""
+            SELECT artist_id, SUM(ms) AS ms FROM daily_rollup GROUP BY artist_id ORDER BY ms DESC LIMIT ?
+        """, (top_n + 1,)).fetchall()
+        self.bound_ms = top[top_n][1] if len(top) > top_n else 0
+        ids = [a for a, _ in top[:top_n]]
+        names = dict(con.execute("""
+            SELECT artist_id, artistName FROM artists WHERE artist_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(ids),)).fetchall())
+        self.artist_ids = np.array(ids, dtype=np.int64)
+        self.artist_names = np.array([names[a] for a in ids], dtype=object)
+        a_ms = np.zeros((self.days, len(ids)), dtype=np.int64)
+        a_plays = np.zeros_like(a_ms)
+        col = {a: i for i, a in enumerate(ids)}
+        for artist_id, day, m, p in con.execute("""
+            SELECT artist_id, day, SUM(ms), SUM(plays) FROM daily_rollup
+            WHERE artist_id IN (SELECT value FROM json_each(?)) GROUP BY artist_id, day
+        """, (json.dumps(ids),)):
+            a_ms[day - first, col[artist_id]] = m
+            a_plays[day - first, col[artist_id]] = p
+        self.cum_artist_ms, self.cum_artist_plays = cumulate(a_ms), cumulate(a_plays)
+
+    def span(self, lo: int, hi: int):
+        # cum rows for the inclusive day range [lo, hi], clipped to the data
+        i = min(max(lo - (self.first or 0), 0), self.days)
+        j = min(max(hi - (self.first or 0) + 1, i), self.days)
+        return i, j
+
+    def between(self, cum, lo: int, hi: int):
+        i, j = self.span(lo, hi)
+        return cum[j] - cum[i]
+
+    def by_hour(self, lo: int, hi: int):
+        # same rows as GROUP BY hour: hours with any play in the range
+        ms = self.between(self.cum_ms, lo, hi).sum(axis=0)
+        seen = self.between(self.cum_plays, lo, hi).sum(axis=0) > 0
+        return pd.DataFrame({"hour": np.flatnonzero(seen),
+                             "hours_listened": sql_round(pd.Series(ms[seen] / 3600000.0), 2)})
+
+    def by_weekday(self, lo: int, hi: int):
+        ms = self.between(self.cum_ms, lo, hi).sum(axis=1)
+        seen = np.flatnonzero(self.between(self.cum_plays, lo, hi).sum(axis=1) > 0)
+        return pd.DataFrame({"weekday": [WEEKDAYS[w] for w in seen],
+                             "hours_listened": sql_round(pd.Series(ms[seen] / 3600000.0), 2)})
+
+    def weekday_hour_hours(self, lo: int, hi: int):
+        # (7 × 24) hours, weekday 0 = Sunday
+        return self.between(self.cum_ms, lo, hi) / 3600000.0
+
+    def skips(self, lo: int, hi: int):
+        total, lt30, lt60 = (int(v) for v in self.between(self.cum_counts, lo, hi))
+        if not total:
+            return pd.DataFrame([[None] * 5], columns=["total_plays", "plays_lt_30s", "pct_lt_30s",
+                                                      "plays_lt_60s", "pct_lt_60s"])
+        return pd.DataFrame({"total_plays": [total],
+                             "plays_lt_30s": [lt30], "pct_lt_30s": [sql_round(100.0 * lt30 / total, 1)],
+                             "plays_lt_60s": [lt60], "pct_lt_60s": [sql_round(100.0 * lt60 / total, 1)]})
+
+    def top_artists(self, lo: int, hi: int, k: int, order=("hours_listened", "plays", "artistName"),
+                    exclude: int | None = None):
+        # Top k artists in the range, sorted like the dashboard's SQL (descending, names
+        # ascending), or None when an artist outside the cube could make the list: that
+        # needs the k-th rounded hours to beat bound_ms rounded
+        ms = self.between(self.cum_artist_ms, lo, hi)
+        plays = self.between(self.cum_artist_plays, lo, hi)
+        df = pd.DataFrame({"artist_id": self.artist_ids, "artistName": self.artist_names,
+                           "ms": ms, "plays": plays})
+        df = df[(df["plays"] > 0) & (df["artist_id"] != exclude)]
+        df = df.assign(hours_listened=sql_round(df["ms"] / 3600000.0, 2))
+        df = df.sort_values(list(order), ascending=[c == "artistName" for c in order], kind="stable").head(k)
+        if self.bound_ms and (len(df) < k or df["hours_listened"].iloc[-1] <= sql_round(self.bound_ms / 3600000.0, 2)):
+            return None
+        return df.reset_index(drop=True)
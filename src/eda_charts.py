@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
-import sqlite3, pathlib
+import sqlite3, pathlib, argparse, os, time
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
+from build_graph import ChartCache, Manifest, code_hash, content_hash, db_fingerprint
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DB = ROOT / "db" / "spotify.db"
 OUT = ROOT / "outputs"
 OUT.mkdir(exist_ok=True, parents=True)
+WEEKDAYS = ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"]
+MON_FIRST = [1, 2, 3, 4, 5, 6, 0]
+# session duration histogram: a bin count or comma-separated edges in minutes,
+# on a linear or log scale (overridden by --duration-bins / --duration-scale)
+DURATION_BINS = "50"
+DURATION_SCALE = "linear"
+
+# Each chart is a data_* function, run in the main process, that queries the DB and
+# returns a dict of numpy arrays (None when there is nothing to draw), and a chart_*
+# function that only draws that dict to a PNG, so drawing can run in worker processes.
+# data_* functions get the shared DayHour aggregate; the time-of-day and calendar
+# charts are all projections of it.
 
 def load_df(query: str) -> pd.DataFrame:
     con = sqlite3.connect(DB)
@@ -15,119 +31,131 @@ def load_df(query: str) -> pd.DataFrame:
     con.close()
     return df
 
+def arrays(df: pd.DataFrame):
+    return None if df.empty else {c: df[c].to_numpy() for c in df.columns}
+
+class DayHour:
+    # Dense (day × hour) matrices of ms and plays from first to last day of the history,
+    # queried once on first use. Sums stay integer ms until the final /3600000.0, so every
+    # projection equals the SQL GROUP BY it replaces; plays > 0 marks the groups SQL
+    # would have returned.
+    @cached_property
+    def grid(self):
+        df = load_df("SELECT day, hour, SUM(ms) AS ms, SUM(plays) AS plays FROM daily_rollup GROUP BY day, hour;")
+        if df.empty:
+            return None
+        day = df["day"].to_numpy()
+        first = int(day.min())
+        ms = np.zeros((int(day.max()) - first + 1, 24), dtype=np.int64)
+        plays = np.zeros_like(ms)
+        ms[day - first, df["hour"]] = df["ms"]
+        plays[day - first, df["hour"]] = df["plays"]
+        return first, ms, plays
+
+    def dates(self):
+        first, ms, _ = self.grid
+        return (first + np.arange(len(ms))).astype("datetime64[D]").astype("datetime64[ns]")
+
+    def daily_hours(self):
+        # every day in the range, 0.0 where nothing was played
+        return self.grid[1].sum(axis=1) / 3600000.0
+
+    def weekday_hour(self):
+        # (7 × 24) ms and plays, weekday 0 = Sunday
+        first, ms, plays = self.grid
+        weekday = (first + np.arange(len(ms)) + 4) % 7
+        wk_ms, wk_plays = np.zeros((7, 24), dtype=np.int64), np.zeros((7, 24), dtype=np.int64)
+        np.add.at(wk_ms, weekday, ms)
+        np.add.at(wk_plays, weekday, plays)
+        return wk_ms, wk_plays
+
 # ---------- existing charts ----------
-def chart_top_artists():
-    df = load_df("""
-        SELECT artistName, SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY artistName
+def data_top_artists(dh):
+    return arrays(load_df("""
+        WITH per_artist AS (SELECT artist_id, SUM(ms) AS ms FROM daily_rollup GROUP BY artist_id)
+        SELECT a.artistName, ms/3600000.0 AS hours
+        FROM per_artist JOIN artists a USING(artist_id)
         ORDER BY hours DESC LIMIT 15;
-    """)
-    if df.empty:
-        return
+    """))
+
+def chart_top_artists(d, path):
     plt.figure(figsize=(10, 6))
-    y = list(df["artistName"])[::-1]
-    x = list(df["hours"])[::-1]
+    y = list(d["artistName"])[::-1]
+    x = list(d["hours"])[::-1]
     plt.barh(y, x)
     plt.xlabel("Hours")
     plt.ylabel("Artist")
     plt.title("Top 15 Artists by Hours Listened")
     plt.tight_layout()
-    plt.savefig(OUT / "chart_top_artists.png", dpi=150)
+    plt.savefig(path, dpi=150)
     plt.close()
 
-def chart_by_hour():
-    df = load_df("""
-        SELECT CAST(strftime('%H', endTime) AS INTEGER) AS hour,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY hour ORDER BY hour;
-    """)
-    if df.empty:
-        return
+def data_by_hour(dh):
+    if dh.grid is None:
+        return None
+    _, ms, plays = dh.grid
+    seen = plays.sum(axis=0) > 0
+    return {"hour": np.flatnonzero(seen), "hours": ms.sum(axis=0)[seen] / 3600000.0}
+
+def chart_by_hour(d, path):
     plt.figure(figsize=(8, 5))
-    plt.plot(df["hour"], df["hours"], marker="o")
+    plt.plot(d["hour"], d["hours"], marker="o")
     plt.xlabel("Hour (0-23)")
     plt.ylabel("Hours Listened")
     plt.title("Listening by Hour of Day")
     plt.xticks(range(0,24,1))
     plt.tight_layout()
-    plt.savefig(OUT / "chart_by_hour.png", dpi=150)
+    plt.savefig(path, dpi=150)
     plt.close()
 
-def chart_monthly_trend():
-    df = load_df("""
-        SELECT strftime('%Y-%m', endTime) AS month,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY month ORDER BY month;
-    """)
-    if df.empty:
-        return
+def data_monthly_trend(dh):
+    if dh.grid is None:
+        return None
+    _, ms, plays = dh.grid
+    months, idx = np.unique(dh.dates().astype("datetime64[M]"), return_inverse=True)
+    ms_month = np.bincount(idx, weights=ms.sum(axis=1))
+    seen = np.bincount(idx, weights=plays.sum(axis=1)) > 0
+    return {"month": months[seen].astype(str).astype(object), "hours": ms_month[seen] / 3600000.0}
+
+def chart_monthly_trend(d, path):
     plt.figure(figsize=(10, 5))
-    plt.plot(df["month"], df["hours"], marker="o")
+    plt.plot(d["month"], d["hours"], marker="o")
     plt.xlabel("Month")
     plt.ylabel("Hours Listened")
     plt.title("Monthly Listening Trend")
     plt.xticks(rotation=45, ha="right")
     plt.tight_layout()
-    plt.savefig(OUT / "chart_monthly_trend.png", dpi=150)
+    plt.savefig(path, dpi=150)
     plt.close()
 
-def chart_weekday():
-    df = load_df("""
-        SELECT CASE strftime('%w', endTime)
-                WHEN '0' THEN 'Sun'
-                WHEN '1' THEN 'Mon'
-                WHEN '2' THEN 'Tue'
-                WHEN '3' THEN 'Wed'
-                WHEN '4' THEN 'Thu'
-                WHEN '5' THEN 'Fri'
-                WHEN '6' THEN 'Sat'
-               END AS weekday,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY weekday;
-    """)
-    if df.empty:
-        return
-    order = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-    df["weekday"] = pd.Categorical(df["weekday"], categories=order, ordered=True)
-    df = df.sort_values("weekday")
+def data_weekday(dh):
+    if dh.grid is None:
+        return None
+    wk_ms, wk_plays = dh.weekday_hour()
+    order = [w for w in MON_FIRST if wk_plays[w].sum() > 0]
+    return {"weekday": np.array([WEEKDAYS[w] for w in order], dtype=object),
+            "hours": wk_ms[order].sum(axis=1) / 3600000.0}
+
+def chart_weekday(d, path):
     plt.figure(figsize=(7,5))
-    plt.bar(df["weekday"], df["hours"])
+    plt.bar(d["weekday"], d["hours"])
     plt.xlabel("Weekday")
     plt.ylabel("Hours Listened")
     plt.title("Listening by Weekday")
     plt.tight_layout()
-    plt.savefig(OUT / "chart_weekday.png", dpi=150)
+    plt.savefig(path, dpi=150)
     plt.close()
 
-# ---------- helpers ----------
-def _ensure_daily(df: pd.DataFrame) -> pd.DataFrame:
-    # df: columns ['date','hours']
-    if df.empty:
-        return df
-    df = df.copy()
-    df["date"] = pd.to_datetime(df["date"])
-    full = pd.DataFrame({"date": pd.date_range(df["date"].min(), df["date"].max(), freq="D")})
-    return full.merge(df, on="date", how="left").fillna({"hours": 0.0})
-
 # ---------- new charts ----------
-def chart_heatmap_hour_weekday():
-    df = load_df("""
-        SELECT CAST(strftime('%H', endTime) AS INTEGER) AS hour,
-               strftime('%w', endTime) AS w,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens
-        GROUP BY w, hour;
-    """)
-    if df.empty:
-        return
-    order = ['1','2','3','4','5','6','0']  # Mon..Sun
-    mat = np.zeros((7, 24), dtype=float)
-    for i, w in enumerate(order):
-        sub = df[df["w"] == w].set_index("hour")["hours"].to_dict()
-        for h in range(24):
-            mat[i, h] = float(sub.get(h, 0.0))
+def data_heatmap_hour_weekday(dh):
+    if dh.grid is None:
+        return None
+    wk_ms, _ = dh.weekday_hour()
+    return {"mat": wk_ms[MON_FIRST] / 3600000.0}
+
+def chart_heatmap_hour_weekday(d, path):
     fig, ax = plt.subplots(figsize=(10, 4))
-    im = ax.imshow(mat, aspect="auto")
+    im = ax.imshow(d["mat"], aspect="auto")
     ax.set_yticks(range(7))
     ax.set_yticklabels(["Mon","Tue","Wed","Thu","Fri","Sat","Sun"])
     ax.set_xticks(range(0,24,2))
@@ -135,106 +163,185 @@ def chart_heatmap_hour_weekday():
     ax.set_title("Listening Heatmap (Weekday × Hour)")
     fig.colorbar(im, ax=ax, label="Hours")
     fig.tight_layout()
-    fig.savefig(OUT / "chart_heatmap_hour_weekday.png", dpi=150)
+    fig.savefig(path, dpi=150)
     plt.close(fig)
 
-def chart_rolling_30d():
-    df = load_df("""
-        SELECT date(endTime) AS date, SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY date ORDER BY date;
-    """)
-    if df.empty:
-        return
-    df = _ensure_daily(df)
-    df["roll30"] = df["hours"].rolling(30, min_periods=1).sum()
+def data_rolling_30d(dh):
+    if dh.grid is None:
+        return None
+    return {"date": dh.dates(), "roll30": pd.Series(dh.daily_hours()).rolling(30, min_periods=1).sum().to_numpy()}
+
+def chart_rolling_30d(d, path):
     fig, ax = plt.subplots(figsize=(10, 3))
-    ax.plot(df["date"], df["roll30"])
+    ax.plot(d["date"], d["roll30"])
     ax.set_title("Rolling 30-Day Listening Hours")
     ax.set_xlabel("Date"); ax.set_ylabel("Hours (30d sum)")
     fig.autofmt_xdate()
     fig.tight_layout()
-    fig.savefig(OUT / "chart_rolling_30d.png", dpi=150)
+    fig.savefig(path, dpi=150)
     plt.close(fig)
 
-def chart_session_duration_hist():
-    df = load_df("SELECT msPlayed FROM listens;")
+def duration_edges(lo: float, hi: float, bins: str, scale: str):
+    # bin edges in minutes spanning [lo, hi]. A log scale starts at 1 second and its edges
+    # are snapped to whole seconds (the rollup's resolution), merging sub-second bins.
+    if "," in bins:
+        return np.array(sorted(float(e) for e in bins.split(",")))
+    if scale == "log":
+        return np.unique(np.round(np.geomspace(max(lo, 1 / 60), max(hi, 2 / 60), int(bins) + 1) * 60)) / 60
+    return np.linspace(lo, hi, int(bins) + 1)
+
+def data_session_duration_hist(dh):
+    # binned from duration_rollup (plays per whole second), so memory is O(distinct seconds)
+    df = load_df("SELECT sec, SUM(plays) AS plays FROM duration_rollup GROUP BY sec;")
     if df.empty:
-        return
-    mins = df["msPlayed"] / 60000.0
+        return None
+    mins = df["sec"].to_numpy() / 60.0
+    edges = duration_edges(mins.min(), mins.max() + 1 / 60, DURATION_BINS, DURATION_SCALE)
+    if DURATION_SCALE == "log":
+        mins = np.maximum(mins, edges[0])  # sub-second plays go in the first bin
+    counts, _ = np.histogram(mins, bins=edges, weights=df["plays"].to_numpy())
+    return {"edges": edges, "counts": counts, "log": DURATION_SCALE == "log"}
+
+def chart_session_duration_hist(d, path):
     fig, ax = plt.subplots(figsize=(8, 4))
-    ax.hist(mins, bins=50)
+    ax.hist(d["edges"][:-1], bins=d["edges"], weights=d["counts"])
+    if d["log"]:
+        ax.set_xscale("log")
     ax.set_xlabel("Session Minutes (per play)")
     ax.set_ylabel("Count")
     ax.set_title("Distribution of Session Durations")
     fig.tight_layout()
-    fig.savefig(OUT / "chart_session_duration_hist.png", dpi=150)
+    fig.savefig(path, dpi=150)
     plt.close(fig)
 
-def chart_cumulative_hours():
-    df = load_df("""
-        SELECT date(endTime) AS date, SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY date ORDER BY date;
-    """)
-    if df.empty:
-        return
-    df = _ensure_daily(df)
-    df["cum"] = df["hours"].cumsum()
+def data_cumulative_hours(dh):
+    if dh.grid is None:
+        return None
+    return {"date": dh.dates(), "cum": np.cumsum(dh.daily_hours())}
+
+def chart_cumulative_hours(d, path):
     fig, ax = plt.subplots(figsize=(10, 3))
-    ax.plot(df["date"], df["cum"])
+    ax.plot(d["date"], d["cum"])
     ax.set_xlabel("Date"); ax.set_ylabel("Cumulative Hours")
     ax.set_title("Cumulative Listening Hours")
     fig.autofmt_xdate()
     fig.tight_layout()
-    fig.savefig(OUT / "chart_cumulative_hours.png", dpi=150)
+    fig.savefig(path, dpi=150)
     plt.close(fig)
 
-def chart_top5_artists_monthly_stacked():
+def data_top5_artists_monthly_stacked(dh):
     # pick top 5 artists overall by hours
     top5 = load_df("""
-        SELECT artistName, SUM(msPlayed) AS ms
-        FROM listens GROUP BY artistName
+        WITH per_artist AS (SELECT artist_id, SUM(ms) AS ms FROM daily_rollup GROUP BY artist_id)
+        SELECT a.artist_id, a.artistName, ms
+        FROM per_artist JOIN artists a USING(artist_id)
         ORDER BY ms DESC LIMIT 5;
     """)
     if top5.empty:
-        return
+        return None
     artists = top5["artistName"].tolist()
-    df = load_df("""
-        SELECT strftime('%Y-%m', endTime) AS month, artistName, SUM(msPlayed)/3600000.0 AS hours
-        FROM listens GROUP BY month, artistName ORDER BY month;
+    ids = ",".join(str(int(i)) for i in top5["artist_id"])
+    df = load_df(f"""
+        SELECT printf('%d-%02d', r.month / 100, r.month % 100) AS month, a.artistName, SUM(r.ms)/3600000.0 AS hours
+        FROM daily_rollup r JOIN artists a USING(artist_id)
+        WHERE r.artist_id IN ({ids})
+        GROUP BY r.month, r.artist_id ORDER BY r.month;
     """)
-    df = df[df["artistName"].isin(artists)]
     if df.empty:
-        return
+        return None
     months = sorted(df["month"].unique().tolist())
-    M = len(months)
-    mat = np.zeros((len(artists), M))
+    mat = np.zeros((len(artists), len(months)))
     for i, a in enumerate(artists):
         sub = df[df["artistName"] == a].set_index("month")["hours"].to_dict()
         mat[i] = [float(sub.get(m, 0.0)) for m in months]
+    return {"artists": artists, "months": months, "mat": mat}
+
+def chart_top5_artists_monthly_stacked(d, path):
+    M = len(d["months"])
     fig, ax = plt.subplots(figsize=(10, 4))
-    ax.stackplot(range(M), *mat, labels=artists)
+    ax.stackplot(range(M), *d["mat"], labels=d["artists"])
     ax.set_xticks(range(M))
-    ax.set_xticklabels(months, rotation=45, ha="right")
+    ax.set_xticklabels(d["months"], rotation=45, ha="right")
     ax.set_ylabel("Hours")
     ax.set_title("Top 5 Artists — Monthly Hours (Stacked)")
     ax.legend(loc="upper left", fontsize=8, ncol=2)
     fig.tight_layout()
-    fig.savefig(OUT / "chart_top5_artists_monthly_stacked.png", dpi=150)
+    fig.savefig(path, dpi=150)
     plt.close(fig)
 
-def main():
+CHARTS = [
     # existing
-    chart_top_artists()
-    chart_by_hour()
-    chart_monthly_trend()
-    chart_weekday()
+    (data_top_artists, chart_top_artists, "chart_top_artists.png"),
+    (data_by_hour, chart_by_hour, "chart_by_hour.png"),
+    (data_monthly_trend, chart_monthly_trend, "chart_monthly_trend.png"),
+    (data_weekday, chart_weekday, "chart_weekday.png"),
     # new
-    chart_heatmap_hour_weekday()
-    chart_rolling_30d()
-    chart_session_duration_hist()
-    chart_cumulative_hours()
-    chart_top5_artists_monthly_stacked()
-    print("Charts saved to outputs/.")
+    (data_heatmap_hour_weekday, chart_heatmap_hour_weekday, "chart_heatmap_hour_weekday.png"),
+    (data_rolling_30d, chart_rolling_30d, "chart_rolling_30d.png"),
+    (data_session_duration_hist, chart_session_duration_hist, "chart_session_duration_hist.png"),
+    (data_cumulative_hours, chart_cumulative_hours, "chart_cumulative_hours.png"),
+    (data_top5_artists_monthly_stacked, chart_top5_artists_monthly_stacked, "chart_top5_artists_monthly_stacked.png"),
+]
+
+def _init_worker():
+    matplotlib.use("Agg")
+
+def draw(chart, d, path):
+    chart(d, path)
+    return path
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Render outputs/chart_*.png")
+    ap.add_argument("--force", action="store_true", help="redraw every chart, ignoring the manifest and cache/charts")
+    ap.add_argument("--refresh-cache", action="store_true", help="store the redrawn charts in cache/charts even under --force")
+    ap.add_argument("--jobs", type=int, default=0, help="charts drawn in parallel processes (0 = one per CPU, 1 = in this process)")
+    ap.add_argument("--duration-bins", default=DURATION_BINS,
+                    help="session duration histogram: number of bins, or comma-separated edges in minutes")
+    ap.add_argument("--duration-scale", choices=["linear", "log"], default=DURATION_SCALE)
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    global DURATION_BINS, DURATION_SCALE
+    args = parse_args(argv)
+    DURATION_BINS, DURATION_SCALE = args.duration_bins, args.duration_scale
+    options = {"chart_session_duration_hist.png": [DURATION_BINS, DURATION_SCALE]}
+    # a chart depends on the DB content and on the code that queries and draws it
+    manifest = Manifest(OUT, args.force)
+    db = db_fingerprint(DB)
+    t0 = time.perf_counter()
+    # a stale chart whose plotted data and drawing code match a cached PNG is copied, not drawn
+    cache = ChartCache()
+    todo, stale, dh = [], 0, DayHour()
+    for data, chart, name in CHARTS:
+        inputs = {"db": db, "code": code_hash(data, chart, load_df, arrays, DayHour, duration_edges),
+                  "options": options.get(name)}
+        if not manifest.stale(OUT / name, inputs):
+            continue
+        stale += 1
+        d = data(dh)
+        if d is None:
+            continue
+        key = content_hash(code_hash(chart), d)
+        if not args.force and cache.fetch(key, OUT / name):
+            manifest.record(OUT / name, inputs)
+        else:
+            todo.append((chart, d, OUT / name, inputs, key))
+    t1 = time.perf_counter()
+    jobs = min(args.jobs or os.cpu_count() or 1, len(todo))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            list(pool.map(draw, *zip(*[(chart, d, path) for chart, d, path, _, _ in todo])))
+    else:
+        for chart, d, path, _, _ in todo:
+            draw(chart, d, path)
+    for _, _, path, inputs, key in todo:
+        if not args.force or args.refresh_cache:
+            cache.store(key, path)
+        manifest.record(path, inputs)
+    manifest.save()
+    print(f"Charts saved to outputs/ ({len(todo)} redrawn, {cache.hits} from cache/charts, "
+          f"{len(CHARTS) - stale} up to date; "
+          f"query {t1 - t0:.2f}s, draw {time.perf_counter() - t1:.2f}s on {max(jobs, 1)} process(es)).")
 
 if __name__ == "__main__":
     main()
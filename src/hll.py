@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# HyperLogLog sketches of the distinct artists and tracks played each day.
+#
+# Distinct counts don't add up across days, so daily_rollup can't answer "unique
+# artists between two dates". Each day instead keeps two HLL sketches (M one-byte
+# registers); the union over any range is the elementwise max of its days, which
+# costs M per day whatever the number of plays, with a standard error of
+# 1.04 / sqrt(M) (1.6% at P = 12). Artists are hashed by artistName and tracks by
+# trackName, the same keys as the exact COUNT(DISTINCT ...) queries.
+import hashlib, math, zlib
+import numpy as np
+
+P = 12
+M = 1 << P
+ALPHA = 0.7213 / (1 + 1.079 / M)
+KINDS = ("artists", "tracks")
+
+def hash_names(names):
+    # 64-bit hash per name, stable across runs and rebuilds (unlike hash())
+    return np.array([int.from_bytes(hashlib.blake2b(n.encode("utf-8"), digest_size=8).digest(), "little")
+                     for n in names], dtype=np.uint64)
+
+def add(regs, rows, h):
+    # fold hashes h into regs[rows]: the top P bits pick the register, the rank of
+    # the first set bit in the remaining 64 - P = 52 bits (exact in float64) is kept
+    idx = (h >> np.uint64(64 - P)).astype(np.int64)
+    rest = (h & np.uint64((1 << (64 - P)) - 1)).astype(np.float64)
+    rank = (64 - P + 1 - np.frexp(rest)[1]).astype(np.uint8)
+    np.maximum.at(regs, (rows, idx), rank)
+
+def estimate(regs) -> float:
+    # HLL estimate of one register array, with linear counting for small cardinalities
+    e = ALPHA * M * M / np.ldexp(1.0, -regs.astype(np.int64)).sum()
+    zeros = int((regs == 0).sum())
+    if e <= 2.5 * M and zeros:
+        e = M * math.log(M / zeros)
+    return e
+
+def refresh_sketches(cur, since_day: int | None = None):
+    # Rebuild day_sketches from daily_rollup, or only days >= since_day
+    lo, hi = cur.execute("SELECT MIN(day), MAX(day) FROM daily_rollup WHERE day >= ?",
+                         (since_day if since_day is not None else -1,)).fetchone()
+    cur.execute("DELETE FROM day_sketches WHERE day >= ?;", (since_day if since_day is not None else -1,))
+    if lo is None:
+        return
+    ids, names = zip(*cur.execute("SELECT artist_id, artistName FROM artists").fetchall())
+    artist_hash = np.zeros(max(ids) + 1, dtype=np.uint64)
+    artist_hash[list(ids)] = hash_names(names)
+    ids, names = zip(*cur.execute("SELECT track_id, trackName FROM tracks").fetchall())
+    track_hash = np.zeros(max(ids) + 1, dtype=np.uint64)
+    track_hash[list(ids)] = hash_names(names)
+    regs = {k: np.zeros((hi - lo + 1, M), dtype=np.uint8) for k in KINDS}
+    # own cursor: the inserts below go through cur
+    rows = cur.connection.execute("SELECT day, artist_id, track_id FROM daily_rollup WHERE day >= ?", (lo,))
+    while chunk := rows.fetchmany(1 << 16):
+        day, artist, track = np.array(chunk, dtype=np.int64).T
+        add(regs["artists"], day - lo, artist_hash[artist])
+        add(regs["tracks"], day - lo, track_hash[track])
+    seen = np.flatnonzero(regs["artists"].any(axis=1))
+    cur.executemany("INSERT INTO day_sketches(day, artists, tracks) VALUES (?,?,?)",
+                    [(lo + int(d), zlib.compress(regs["artists"][d].tobytes()), zlib.compress(regs["tracks"][d].tobytes()))
+                     for d in seen])
+
+class DaySketches:
+    # every day's registers in memory, so a range union is one max over a slice
+    def __init__(self, con):
+        rows = con.execute("SELECT day, artists, tracks FROM day_sketches ORDER BY day").fetchall()
+        self.first = rows[0][0] if rows else 0
+        days = rows[-1][0] - self.first + 1 if rows else 0
+        self.regs = {k: np.zeros((days, M), dtype=np.uint8) for k in KINDS}
+        for day, *blobs in rows:
+            for k, blob in zip(KINDS, blobs):
+                self.regs[k][day - self.first] = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+
+    def distinct(self, lo: int, hi: int):
+        # approximate (artists, tracks) played in the inclusive day range
+        i = min(max(lo - self.first, 0), len(self.regs["artists"]))
+        j = min(max(hi - self.first + 1, i), len(self.regs["artists"]))
+        if i == j:
+            return 0, 0
+        return tuple(round(estimate(self.regs[k][i:j].max(axis=0))) for k in KINDS)
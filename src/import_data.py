@@ -1,20 +1,433 @@
 #!/usr/bin/env python3
-import json, sqlite3, pathlib, time, os, tempfile, shutil
+import json, sqlite3, pathlib, time, os, sys, tempfile, shutil, argparse, itertools, hashlib
+import datetime as dt
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from artist_search import index_artists
+from sessions import SESSION_GAP_MIN, refresh_sessions
+from transitions import refresh_transitions
+from hll import refresh_sketches
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DATA = ROOT / "data"
 DB    = ROOT / "db" / "spotify.db"
 DB.parent.mkdir(parents=True, exist_ok=True)
 
-def load_jsons():
-    paths = sorted(DATA.glob("StreamingHistory_music_*.json"))
-    rows = []
+CHUNK_SIZE = 1 << 16     # characters read per file chunk
+BATCH_SIZE = 5000        # rows per executemany call
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+def export_order(path: pathlib.Path):
+    # StreamingHistory_music_<n>.json by n, so _10 sorts after _2
+    stem, _, n = pathlib.Path(path).stem.rpartition("_")
+    return (stem, int(n)) if n.isdigit() else (path.stem, -1)
+
+def source_paths():
+    return sorted(DATA.glob("StreamingHistory_music_*.json"), key=export_order)
+
+def iter_records(path: pathlib.Path, chunk_size: int = CHUNK_SIZE):
+    # Decode the top-level JSON array one object at a time, holding at most
+    # one chunk (plus a partial record) of the file in memory.
+    dec = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof, opened = "", 0, False, False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf):
+                if not opened:
+                    if buf[pos] != "[":
+                        raise ValueError(f"{path.name}: expected a JSON array")
+                    opened, pos = True, pos + 1
+                    continue
+                if buf[pos] == "]":
+                    return
+                try:
+                    obj, end = dec.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof: raise
+                else:
+                    yield obj
+                    pos = end
+                    continue
+            elif eof:
+                raise ValueError(f"{path.name}: truncated JSON array")
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+
+def time_parts(end: str):
+    # 'YYYY-MM-DD HH:MM' -> (epoch minutes, epoch day, hour, weekday 0=Sun, month as YYYYMM)
+    y, mo, h, mi = int(end[0:4]), int(end[5:7]), int(end[11:13]), int(end[14:16])
+    day = dt.date(y, mo, int(end[8:10])).toordinal() - EPOCH_ORDINAL
+    if not (0 <= h < 24 and 0 <= mi < 60):
+        raise ValueError(f"bad time of day in {end!r}")
+    return day * 1440 + h * 60 + mi, day, h, (day + 4) % 7, y * 100 + mo
+
+def normalize(r, where: str):
+    # Validate one export record and return it as an insert tuple:
+    # (endTime, artistName, trackName, msPlayed, *time_parts(endTime))
+    try:
+        end, artist, track, ms = r["endTime"], r["artistName"], r["trackName"], int(r["msPlayed"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{where}: malformed record ({e!r})") from None
+    if not (isinstance(end, str) and len(end) == 16 and end[4] == "-" and end[10] == " " and end[13] == ":"):
+        raise ValueError(f"{where}: endTime {end!r} is not 'YYYY-MM-DD HH:MM'")
+    if not isinstance(artist, str) or not isinstance(track, str) or ms < 0:
+        raise ValueError(f"{where}: bad artistName/trackName/msPlayed")
+    try:
+        return (end, artist, track, ms) + time_parts(end)
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}") from None
+
+def iter_rows(paths):
     for p in paths:
-        with open(p, "r", encoding="utf-8") as f:
-            rows.extend(json.load(f))
-    if not rows:
-        raise SystemExit("No streaming history files found in data/")
-    return rows
+        for i, r in enumerate(iter_records(p)):
+            yield normalize(r, f"{p.name}[{i}]")
+
+def parse_file(path: pathlib.Path):
+    # Process-pool task: decode and validate a whole export file
+    return list(iter_rows([path]))
+
+def iter_parsed(paths, workers: int = 1):
+    # Yield (path, rows) in file order. With workers > 1 files are parsed in a
+    # process pool while the caller writes; at most 2*workers parsed files are
+    # in flight so memory stays bounded.
+    if workers <= 1:
+        for p in paths:
+            yield p, iter_rows([p])
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = iter(paths)
+        window = [(p, ex.submit(parse_file, p)) for p in itertools.islice(pending, 2 * workers)]
+        while window:
+            p, fut = window.pop(0)
+            rows = fut.result()
+            for nxt in itertools.islice(pending, 1):
+                window.append((nxt, ex.submit(parse_file, nxt)))
+            yield p, rows
+
+def file_sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def batched(rows, size: int):
+    it = iter(rows)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB elsewhere
+
+SCHEMA_VERSION = 9   # stored in PRAGMA user_version; bump when the layout changes
+
+SCHEMA = """
+-- dimension tables with integer surrogate keys
+CREATE TABLE IF NOT EXISTS artists(
+    artist_id  INTEGER PRIMARY KEY,
+    artistName TEXT    NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tracks(
+    track_id   INTEGER PRIMARY KEY,
+    artist_id  INTEGER NOT NULL REFERENCES artists(artist_id),
+    trackName  TEXT    NOT NULL,
+    UNIQUE(artist_id, trackName)
+);
+-- fact table: one row per play. endTime is stored pre-split into integer
+-- columns so queries never call strftime()/date() per row:
+--   ts_min = minutes since 1970-01-01, day = days since 1970-01-01,
+--   hour 0-23, weekday 0=Sun..6=Sat (as strftime('%w')), month = YYYYMM
+CREATE TABLE IF NOT EXISTS plays(
+    ts_min     INTEGER NOT NULL,
+    day        INTEGER NOT NULL,
+    hour       INTEGER NOT NULL,
+    weekday    INTEGER NOT NULL,
+    month      INTEGER NOT NULL,
+    artist_id  INTEGER NOT NULL,
+    track_id   INTEGER NOT NULL,
+    msPlayed   INTEGER NOT NULL
+);
+-- Rollup of plays per (day, hour, track). Every dashboard/report aggregate is
+-- derivable from it and it is orders of magnitude smaller than plays.
+-- Maintained by refresh_rollups(): full rebuild, or only days >= the first
+-- appended day on --incremental.
+CREATE TABLE IF NOT EXISTS daily_rollup(
+    day          INTEGER NOT NULL,
+    hour         INTEGER NOT NULL,
+    weekday      INTEGER NOT NULL,
+    month        INTEGER NOT NULL,
+    artist_id    INTEGER NOT NULL,
+    track_id     INTEGER NOT NULL,
+    plays        INTEGER NOT NULL,
+    ms           INTEGER NOT NULL,
+    plays_lt_30s INTEGER NOT NULL,
+    plays_lt_60s INTEGER NOT NULL,
+    PRIMARY KEY (day, hour, track_id)
+) WITHOUT ROWID;
+-- Plays per (day, whole second of msPlayed), for duration histograms with any
+-- bin edges at 1s resolution without reading plays. Refreshed with daily_rollup.
+CREATE TABLE IF NOT EXISTS duration_rollup(
+    day   INTEGER NOT NULL,
+    sec   INTEGER NOT NULL,
+    plays INTEGER NOT NULL,
+    PRIMARY KEY (day, sec)
+) WITHOUT ROWID;
+-- Artist search index (src/artist_search.py): folded name per artist and its
+-- trigrams, filled by index_artists() for artists added by each load.
+CREATE TABLE IF NOT EXISTS artist_keys(
+    artist_id INTEGER PRIMARY KEY,
+    name_key  TEXT    NOT NULL,
+    grams     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artist_grams(
+    gram      TEXT    NOT NULL,
+    artist_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, artist_id)
+) WITHOUT ROWID;
+-- Listening sessions (src/sessions.py): runs of plays separated by gaps of at most
+-- settings.session_gap_min minutes. start_min is when the first play started,
+-- end_min when the last one ended (minutes since 1970-01-01), day = start_min / 1440.
+CREATE TABLE IF NOT EXISTS sessions(
+    session_id INTEGER PRIMARY KEY,
+    day        INTEGER NOT NULL,
+    start_min  INTEGER NOT NULL,
+    end_min    INTEGER NOT NULL,
+    plays      INTEGER NOT NULL,
+    ms         INTEGER NOT NULL,
+    artists    INTEGER NOT NULL
+);
+-- Track and artist transition counts between consecutive plays of a session
+-- (src/transitions.py), one CSR matrix per kind: zlib'd little-endian arrays
+-- indptr (int64, n + 1), indices and data (int32, nnz), rows/columns = ids.
+CREATE TABLE IF NOT EXISTS transitions(
+    kind    TEXT    PRIMARY KEY,
+    gap_min INTEGER NOT NULL,
+    n       INTEGER NOT NULL,
+    nnz     INTEGER NOT NULL,
+    indptr  BLOB    NOT NULL,
+    indices BLOB    NOT NULL,
+    data    BLOB    NOT NULL
+);
+-- Per-day HyperLogLog sketches (src/hll.py) of distinct artistName / trackName,
+-- zlib'd uint8 registers. Refreshed with daily_rollup.
+CREATE TABLE IF NOT EXISTS day_sketches(
+    day     INTEGER PRIMARY KEY,
+    artists BLOB    NOT NULL,
+    tracks  BLOB    NOT NULL
+);
+-- import options the stored data depends on, as JSON values
+CREATE TABLE IF NOT EXISTS settings(
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+-- compatibility view with the original single-table layout
+CREATE VIEW IF NOT EXISTS listens AS
+    SELECT strftime('%Y-%m-%d %H:%M', p.ts_min * 60, 'unixepoch') AS endTime,
+           a.artistName, t.trackName, p.msPlayed
+    FROM plays p JOIN tracks t ON t.track_id = p.track_id JOIN artists a ON a.artist_id = p.artist_id;
+-- one row per loaded export file, MAX(max_endTime) is the append high-water mark
+CREATE TABLE IF NOT EXISTS source_files(
+    path        TEXT    PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    sha256      TEXT    NOT NULL,
+    rows        INTEGER NOT NULL,
+    min_endTime TEXT,
+    max_endTime TEXT,
+    loaded_at   TEXT    NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+# Created after the bulk load, which is faster than maintaining them per insert.
+# Shipped queries read daily_rollup, whose primary key (day, hour, track_id)
+# serves date-range filters; the other indexes cover the remaining query
+# families (src/check_query_plans.py enforces that plays is never table-scanned):
+#   plays_ts       time-ordered scans of plays and incremental rollup refresh
+#   rollup_artist  per-artist totals, first-seen day, one artist's daily hours
+#   rollup_track   per-track totals, replays, guilty pleasures
+#   rollup_month   monthly trend, binges, top-5 stacked chart
+#   sessions_day   session stats for a date range
+INDEXES = """
+CREATE INDEX IF NOT EXISTS plays_ts ON plays(ts_min, artist_id, track_id, msPlayed);
+CREATE INDEX IF NOT EXISTS rollup_artist ON daily_rollup(artist_id, day, month, ms, plays);
+CREATE INDEX IF NOT EXISTS rollup_track ON daily_rollup(track_id, ms, plays);
+CREATE INDEX IF NOT EXISTS rollup_month ON daily_rollup(month, artist_id, track_id, ms);
+CREATE INDEX IF NOT EXISTS sessions_day ON sessions(day, start_min, end_min, plays, ms, artists);
+"""
+
+ROLLUP_SQL = """
+INSERT INTO daily_rollup(day, hour, weekday, month, artist_id, track_id, plays, ms, plays_lt_30s, plays_lt_60s)
+SELECT day, hour, weekday, month, artist_id, track_id,
+       COUNT(*), SUM(msPlayed), SUM(msPlayed < 30000), SUM(msPlayed < 60000)
+FROM plays {where}
+GROUP BY day, hour, track_id
+"""
+
+DURATION_ROLLUP_SQL = """
+INSERT INTO duration_rollup(day, sec, plays)
+SELECT day, msPlayed / 1000, COUNT(*)
+FROM plays {where}
+GROUP BY day, msPlayed / 1000
+"""
+
+def run_script(cur, script: str):
+    for stmt in script.split(";"):
+        if stmt.strip():
+            cur.execute(stmt)
+
+def create_schema(cur):
+    run_script(cur, SCHEMA)
+    cur.execute(f"PRAGMA user_version={SCHEMA_VERSION};")
+
+def refresh_rollups(cur, since_day: int | None = None):
+    # Re-aggregate daily_rollup and duration_rollup from plays. With since_day only
+    # days >= since_day are rebuilt, reading just those plays through the plays_ts index.
+    for table, sql in [("daily_rollup", ROLLUP_SQL), ("duration_rollup", DURATION_ROLLUP_SQL)]:
+        if since_day is None:
+            cur.execute(f"DELETE FROM {table};")
+            cur.execute(sql.format(where=""))
+        else:
+            cur.execute(f"DELETE FROM {table} WHERE day >= ?;", (since_day,))
+            cur.execute(sql.format(where="WHERE ts_min >= ?"), (since_day * 1440,))
+
+def create_indexes(cur):
+    run_script(cur, INDEXES)
+    # sampled statistics so the planner picks the covering index for each query
+    cur.execute("PRAGMA analysis_limit=1000;")
+    cur.execute("ANALYZE;")
+
+class Dimensions:
+    # In-memory name -> id maps for artists/tracks; new names get the next id
+    def __init__(self, cur):
+        self.artists = {name: i for i, name in cur.execute("SELECT artist_id, artistName FROM artists")}
+        self.tracks = {(a, name): i for i, a, name in cur.execute("SELECT track_id, artist_id, trackName FROM tracks")}
+
+    def insert(self, cur, batch):
+        # Insert normalize()d rows as plays
+        new_artists, new_tracks, facts = [], [], []
+        for _, artist, track, ms, *when in batch:
+            a = self.artists.get(artist)
+            if a is None:
+                a = self.artists[artist] = len(self.artists) + 1
+                new_artists.append((a, artist))
+            t = self.tracks.get((a, track))
+            if t is None:
+                t = self.tracks[(a, track)] = len(self.tracks) + 1
+                new_tracks.append((t, a, track))
+            facts.append((*when, a, t, ms))
+        cur.executemany("INSERT INTO artists(artist_id, artistName) VALUES (?,?)", new_artists)
+        cur.executemany("INSERT INTO tracks(track_id, artist_id, trackName) VALUES (?,?,?)", new_tracks)
+        cur.executemany(
+            "INSERT INTO plays(ts_min, day, hour, weekday, month, artist_id, track_id, msPlayed) VALUES (?,?,?,?,?,?,?,?)",
+            facts,
+        )
+
+def is_legacy(con) -> bool:
+    row = con.execute("SELECT type FROM sqlite_master WHERE name = 'listens'").fetchone()
+    return row is not None and row[0] == "table"
+
+def upgrade_legacy(con, batch_size: int = BATCH_SIZE) -> bool:
+    # Convert a DB from the old single-table importer (listens as a TABLE) to the
+    # current schema in place. Used by the dashboard on in-memory copies.
+    if not is_legacy(con):
+        return False
+    with con:
+        cur = con.cursor()
+        cur.execute("ALTER TABLE listens RENAME TO listens_legacy;")
+        create_schema(cur)
+        dims = Dimensions(cur)
+        src = con.execute("""
+            SELECT endTime, COALESCE(artistName, ''), COALESCE(trackName, ''), COALESCE(msPlayed, 0)
+            FROM listens_legacy WHERE endTime IS NOT NULL""")
+        while batch := src.fetchmany(batch_size):
+            dims.insert(cur, [r + time_parts(r[0]) for r in batch])
+        cur.execute("DROP TABLE listens_legacy;")
+        refresh_rollups(cur)
+        refresh_sketches(cur)
+        index_artists(cur)
+        create_indexes(cur)
+        refresh_sessions(cur)
+        refresh_transitions(cur)
+    return True
+
+class Overlap(Exception):
+    # a new export file has plays older than the high-water mark
+    pass
+
+def boundary_plays(cur, after: str) -> Counter:
+    # (artistName, trackName, msPlayed) of the plays already loaded in the mark's minute
+    return Counter(cur.execute("""
+        SELECT a.artistName, t.trackName, p.msPlayed
+        FROM plays p JOIN tracks t ON t.track_id = p.track_id JOIN artists a ON a.artist_id = p.artist_id
+        WHERE p.ts_min = ?
+    """, (time_parts(after)[0],)).fetchall())
+
+def after_mark(rows, after: str, seen: Counter, name: str):
+    # Rows of a new file: anything before the mark means the file overlaps what is
+    # loaded; in the mark's own minute a play already loaded is skipped once
+    for r in rows:
+        if r[0] < after:
+            raise Overlap(f"{name} has plays from {r[0]}, before the last loaded {after}")
+        if r[0] == after and seen[r[1:4]]:
+            seen[r[1:4]] -= 1
+            continue
+        yield r
+
+def load_files(cur, paths, batch_size: int, after: str | None = None, workers: int = 1) -> int:
+    # Append every row of each file and record the file in source_files. With
+    # `after` (the high-water mark) see after_mark(). Returns the number of rows
+    # inserted. This is the single SQLite writer; parsing may happen in worker processes.
+    total, dims = 0, Dimensions(cur)
+    seen = boundary_plays(cur, after) if after is not None else Counter()
+    for p, rows in iter_parsed(paths, workers):
+        st = p.stat()
+        n, lo, hi = 0, None, None
+        if after is not None:
+            rows = after_mark(rows, after, seen, p.name)
+        for batch in batched(rows, batch_size):
+            dims.insert(cur, batch)
+            n += len(batch)
+            b_lo, b_hi = min(r[0] for r in batch), max(r[0] for r in batch)
+            lo = b_lo if lo is None else min(lo, b_lo)
+            hi = b_hi if hi is None else max(hi, b_hi)
+        cur.execute(
+            "INSERT OR REPLACE INTO source_files(path, size, mtime_ns, sha256, rows, min_endTime, max_endTime) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (p.name, st.st_size, st.st_mtime_ns, file_sha256(p), n, lo, hi),
+        )
+        total += n
+    return total
+
+def plan_incremental(cur, paths):
+    # Returns (new_paths, reason). new_paths is None when a full rebuild is needed.
+    if cur.execute("PRAGMA user_version;").fetchone()[0] != SCHEMA_VERSION:
+        return None, "database schema is out of date"
+    try:
+        loaded = {r[0]: r[1:] for r in cur.execute("SELECT path, size, mtime_ns, sha256 FROM source_files")}
+    except sqlite3.OperationalError:
+        return None, "database has no load metadata"
+    if not loaded:
+        return None, "database has no load metadata"
+    by_name = {p.name: p for p in paths}
+    for name, (size, mtime_ns, sha) in loaded.items():
+        p = by_name.get(name)
+        if p is None:
+            return None, f"{name} was removed"
+        st = p.stat()
+        if (st.st_size, st.st_mtime_ns) == (size, mtime_ns):
+            continue
+        if file_sha256(p) != sha:
+            return None, f"{name} changed since it was loaded"
+        # touched but identical: remember the new stat so we skip hashing next time
+        cur.execute("UPDATE source_files SET size=?, mtime_ns=? WHERE path=?", (st.st_size, st.st_mtime_ns, name))
+    return [p for p in paths if p.name not in loaded], None
 
 def connect(path: pathlib.Path):
     # Wait up to 30s for any other process to finish
@@ -25,9 +438,59 @@ def connect(path: pathlib.Path):
     cur.execute("PRAGMA synchronous=NORMAL;")
     return conn, cur
 
-def main():
-    rows = load_jsons()
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Load StreamingHistory_music_*.json into db/spotify.db")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                    help=f"rows per executemany batch (default {BATCH_SIZE})")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes used to parse export files in parallel (default 1 = serial, 0 = one per CPU)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="append only files not loaded yet (rows after the high-water mark); "
+                         "falls back to a full rebuild if a loaded file changed or disappeared")
+    ap.add_argument("--session-gap", type=int, default=SESSION_GAP_MIN,
+                    help=f"minutes of silence that end a listening session (default {SESSION_GAP_MIN})")
+    return ap.parse_args(argv)
 
+def append_new(paths, batch_size: int, workers: int = 1, session_gap: int = SESSION_GAP_MIN):
+    # Returns the number of rows appended, or None if a full rebuild is required.
+    if not DB.exists():
+        print("No existing database; doing a full rebuild.")
+        return None
+    conn, cur = connect(DB)
+    try:
+        cur.execute("BEGIN IMMEDIATE;")
+        new, reason = plan_incremental(cur, paths)
+        if new is None:
+            cur.execute("ROLLBACK;")
+            print(f"Full rebuild required: {reason}.")
+            return None
+        hwm = cur.execute("SELECT MAX(max_endTime) FROM source_files").fetchone()[0]
+        last_rowid = cur.execute("SELECT COALESCE(MAX(rowid), 0) FROM plays").fetchone()[0]
+        try:
+            n = load_files(cur, new, batch_size, after=hwm, workers=workers)
+        except Overlap as e:
+            cur.execute("ROLLBACK;")
+            print(f"Full rebuild required: {e}.")
+            return None
+        if n:
+            # new rows all end in the high-water mark's minute or later, so only its day onwards changed
+            refresh_rollups(cur, time_parts(hwm)[1] if hwm else None)
+            refresh_sketches(cur, time_parts(hwm)[1] if hwm else None)
+            index_artists(cur)
+        # also picks up a changed --session-gap when nothing new was loaded
+        refresh_sessions(cur, session_gap, since_last=True)
+        refresh_transitions(cur, session_gap, last_rowid)
+        cur.execute("COMMIT;")
+    except BaseException:
+        try: cur.execute("ROLLBACK;")
+        except Exception: pass
+        raise
+    finally:
+        conn.close()
+    print(f"Appended {n} rows from {len(new)} new files (after {hwm}) into {DB}")
+    return n
+
+def rebuild(paths, batch_size: int, workers: int = 1, session_gap: int = SESSION_GAP_MIN) -> int:
     # 1) Build DB in a temp file to avoid fighting an open handle on spotify.db
     tmp_dir = tempfile.mkdtemp(prefix="spotify_db_")
     tmp_db  = pathlib.Path(tmp_dir) / "spotify_tmp.db"
@@ -35,21 +498,20 @@ def main():
     conn, cur = connect(tmp_db)
     try:
         cur.execute("BEGIN;")
-        cur.executescript("""
-        DROP TABLE IF EXISTS listens;
-        CREATE TABLE listens(
-            endTime    TEXT    NOT NULL,
-            artistName TEXT    NOT NULL,
-            trackName  TEXT    NOT NULL,
-            msPlayed   INTEGER NOT NULL
-        );
-        """)
-        cur.executemany(
-            "INSERT INTO listens(endTime, artistName, trackName, msPlayed) VALUES (?,?,?,?)",
-            [(r["endTime"], r["artistName"], r["trackName"], int(r["msPlayed"])) for r in rows]
-        )
+        create_schema(cur)
+        # Rows stream file-by-file, record-by-record into bounded batches
+        n = load_files(cur, paths, batch_size, workers=workers)
+        if not n:
+            raise SystemExit("No streaming history rows found in data/")
+        refresh_rollups(cur)
+        refresh_sketches(cur)
+        index_artists(cur)
+        create_indexes(cur)
+        # after create_indexes: both read plays in plays_ts order
+        refresh_sessions(cur, session_gap)
+        refresh_transitions(cur, session_gap)
         cur.execute("COMMIT;")
-    except Exception:
+    except BaseException:
         try: cur.execute("ROLLBACK;")
         except Exception: pass
         conn.close()
@@ -68,7 +530,22 @@ def main():
 
     os.replace(tmp_db, DB)  # atomic on same filesystem
     shutil.rmtree(tmp_dir, ignore_errors=True)
-    print(f"Loaded {len(rows)} rows into {DB}")
+    print(f"Loaded {n} rows from {len(paths)} files into {DB}")
+    return n
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = source_paths()
+    if not paths:
+        raise SystemExit("No streaming history files found in data/")
+    workers = args.workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if not args.incremental or append_new(paths, args.batch_size, workers, args.session_gap) is None:
+        rebuild(paths, args.batch_size, workers, args.session_gap)
+    print(f"Import finished in {time.perf_counter() - t0:.2f}s")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS: {rss:.1f} MB")
 
 if __name__ == "__main__":
     main()
@@ -1,22 +1,73 @@
 #!/usr/bin/env python3
-import sqlite3, pathlib, pandas as pd
+import sqlite3, pathlib, argparse, threading, time, os, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from build_graph import Manifest, db_fingerprint, file_hash
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DB = ROOT / "db" / "spotify.db"
 SQL_DIR = ROOT / "sql"
 OUT = ROOT / "outputs"
 OUT.mkdir(exist_ok=True, parents=True)
+SECTIONS = ["top_artists.sql","top_tracks.sql","by_hour.sql","by_weekday.sql","by_month.sql","artist_binges.sql","skips.sql","repeats.sql","top_replays.sql","discovery.sql"]
+_local = threading.local()
+def connection():
+    # One read-only connection per worker thread; sqlite3 releases the GIL while a query runs
+    if getattr(_local, "db", None) != DB:
+        _local.con = sqlite3.connect(f"file:{pathlib.Path(DB).as_posix()}?mode=ro", uri=True, check_same_thread=False)
+        _local.db = DB
+    return _local.con
 def run_sql(name: str):
     sql_path = SQL_DIR / name
     with open(sql_path, "r", encoding="utf-8") as f:
         q = f.read()
-    con = sqlite3.connect(DB)
-    df = pd.read_sql_query(q, con)
-    con.close()
+    t0 = time.perf_counter()
+    df = pd.read_sql_query(q, connection())
+    secs = time.perf_counter() - t0
     df.to_csv(OUT / f"{name.replace('.sql','.csv')}", index=False)
-    return df
-def main():
-    sections = ["top_artists.sql","top_tracks.sql","by_hour.sql","by_weekday.sql","by_month.sql","artist_binges.sql","skips.sql","repeats.sql","top_replays.sql","discovery.sql"]
-    results = {name: run_sql(name) for name in sections}
+    return df, secs
+def print_timings(done: dict, jobs: int, wall: float):
+    # every section: the ones run by time spent, then the ones skipped as up to date
+    print(f"{'section':<20} {'rows':>6} {'seconds':>10}")
+    for name, (df, secs) in sorted(done.items(), key=lambda kv: -kv[1][1]):
+        print(f"{name:<20} {len(df):>6} {secs:>10.3f}")
+    for name in SECTIONS:
+        if name not in done:
+            print(f"{name:<20} {'-':>6} {'up to date':>10}")
+    print(f"{len(done)} of {len(SECTIONS)} sections run, {jobs} jobs: {wall:.3f}s wall, "
+          f"{sum(s for _, s in done.values()):.3f}s summed")
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Run sql/*.sql into outputs/*.csv and outputs/insights.md")
+    ap.add_argument("--jobs", type=int, default=0, help="sections run concurrently (0 = one per CPU, 1 = one after another)")
+    ap.add_argument("--force", action="store_true", help="rerun every section even if its CSV is up to date")
+    return ap.parse_args(argv)
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = args.jobs or os.cpu_count() or 1
+    # a CSV depends on the DB content, its SQL and this script; insights.md on all of them
+    manifest = Manifest(OUT, args.force)
+    base = {"db": db_fingerprint(DB), "code": file_hash(__file__)}
+    inputs = {name: {**base, "sql": file_hash(SQL_DIR / name)} for name in SECTIONS}
+    csv = {name: OUT / name.replace(".sql", ".csv") for name in SECTIONS}
+    insights_inputs = {**base, "sql": {name: inputs[name]["sql"] for name in SECTIONS}}
+    stale = [name for name in SECTIONS if manifest.stale(csv[name], inputs[name])]
+    write_insights = manifest.stale(OUT / "insights.md", insights_inputs)
+    if write_insights:
+        stale = SECTIONS
+    if not stale:
+        print("outputs/*.csv and insights.md are up to date")
+        print_timings({}, jobs, 0.0)
+        return
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        done = dict(zip(stale, pool.map(run_sql, stale)))
+    wall = time.perf_counter() - t0
+    for name in stale:
+        manifest.record(csv[name], inputs[name])
+    if not write_insights:
+        manifest.save()
+        print(f"Reran {len(stale)} of {len(SECTIONS)} sections; insights.md is up to date")
+        print_timings(done, jobs, wall)
+        return
+    results = {name: df for name, (df, _) in done.items()}
     # insights
     ta = results["top_artists.sql"].head(5)
     tt = results["top_tracks.sql"].head(5)
@@ -36,6 +87,9 @@ def main():
     lines.append("- **Peak hours:** " + ", ".join(str(int(r['hour'])) for _, r in by_hour.iterrows()) + "h.")
     lines.append("- **Top weekdays:** " + ", ".join(r['weekday'] for _, r in by_weekday.iterrows()) + ".")
     (OUT / "insights.md").write_text("\n".join(lines), encoding="utf-8")
+    manifest.record(OUT / "insights.md", insights_inputs)
+    manifest.save()
     print("Wrote CSVs and insights.md to outputs/")
+    print_timings(done, jobs, wall)
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Listening sessions: runs of plays where each play starts at most SESSION_GAP_MIN
+# minutes after the previous one ended.
+#
+# Plays are streamed in ts_min order through the plays_ts index and split with one
+# numpy diff/cumsum per chunk, so the pass is linear in the number of plays; only the
+# still-open last session of a chunk is carried into the next one. A play's session
+# is the one whose [start_min, end_min] contains its ts_min (sessions never overlap).
+import json
+import numpy as np
+
+SESSION_GAP_MIN = 30
+CHUNK = 1 << 18  # plays per numpy pass
+# (label, exclusive upper bound): session length in minutes, distinct artists per session
+LENGTH_BUCKETS = [("<10 min", 10), ("10–30 min", 30), ("30–60 min", 60), ("1–2 h", 120), ("2–4 h", 240), ("4 h+", None)]
+ARTIST_BUCKETS = [("1", 2), ("2–3", 4), ("4–10", 11), ("11+", None)]
+
+def sessionize(ts, ms, artist, gap: int = SESSION_GAP_MIN):
+    # ts (minutes, sorted), ms and artist per play -> one row per session
+    start = ts - ms // 60000
+    new = np.ones(len(ts), dtype=bool)
+    new[1:] = start[1:] - ts[:-1] > gap
+    first = np.flatnonzero(new)
+    sid = np.cumsum(new) - 1
+    pairs = np.unique((sid << 32) | artist)  # distinct (session, artist)
+    return dict(
+        start_min = start[first],
+        end_min = ts[np.append(first[1:], len(ts)) - 1],
+        plays = np.diff(np.append(first, len(ts))),
+        ms = np.add.reduceat(ms, first),
+        artists = np.bincount(pairs >> 32, minlength=len(first)),
+    )
+
+def insert_sessions(cur, s, first_id: int):
+    n = len(s["plays"])
+    cur.executemany(
+        "INSERT INTO sessions(session_id, day, start_min, end_min, plays, ms, artists) VALUES (?,?,?,?,?,?,?)",
+        zip(range(first_id, first_id + n), (s["start_min"] // 1440).tolist(), s["start_min"].tolist(),
+            s["end_min"].tolist(), s["plays"].tolist(), s["ms"].tolist(), s["artists"].tolist()))
+    return first_id + n
+
+def refresh_sessions(cur, gap: int = SESSION_GAP_MIN, since_last: bool = False):
+    # Rebuild the sessions table. With since_last (appends only add later plays) only
+    # the last session is recomputed, unless the stored gap differs from this one.
+    stored = cur.execute("SELECT value FROM settings WHERE key = 'session_gap_min'").fetchone()
+    last = cur.execute("SELECT session_id, start_min FROM sessions ORDER BY session_id DESC LIMIT 1").fetchone()
+    if since_last and last and stored and json.loads(stored[0]) == gap:
+        next_id, since = last
+        cur.execute("DELETE FROM sessions WHERE session_id >= ?;", (next_id,))
+    else:
+        next_id, since = 1, None
+        cur.execute("DELETE FROM sessions;")
+    cur.execute("INSERT OR REPLACE INTO settings(key, value) VALUES ('session_gap_min', ?)", (json.dumps(gap),))
+    # own cursor: inserting through cur would reset this one
+    rows = cur.connection.execute("SELECT ts_min, msPlayed, artist_id FROM plays WHERE ts_min >= ? ORDER BY ts_min",
+                                  (since if since is not None else -1,))
+    carry = np.empty((0, 3), dtype=np.int64)
+    while True:
+        chunk = rows.fetchmany(CHUNK)
+        buf = np.concatenate([carry, np.array(chunk, dtype=np.int64).reshape(-1, 3)])
+        if not len(buf):
+            break
+        s = sessionize(buf[:, 0], buf[:, 1], buf[:, 2], gap)
+        if chunk:
+            # the last session may continue into the next chunk
+            carry = buf[len(buf) - s["plays"][-1]:]
+            s = {k: v[:-1] for k, v in s.items()}
+        next_id = insert_sessions(cur, s, next_id)
+        if not chunk:
+            break
+
+def bucket(values, buckets):
+    edges = [b for _, b in buckets[:-1]]
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(buckets))
+    return {"bucket": [label for label, _ in buckets], "sessions": counts.tolist()}
+
+def summarize(df):
+    # df: sessions rows (start_min, end_min, plays, ms, artists) -> headline numbers and
+    # distributions (columns for a DataFrame; pandas stays out of the importer)
+    minutes = (df["end_min"] - df["start_min"]).to_numpy()
+    n = len(df)
+    return dict(
+        sessions = n,
+        median_minutes = float(np.median(minutes)) if n else 0.0,
+        mean_plays = float(df["plays"].mean()) if n else 0.0,
+        mean_artists = float(df["artists"].mean()) if n else 0.0,
+        pct_single_artist = round(100.0 * float((df["artists"] == 1).mean()), 1) if n else 0.0,
+        lengths = bucket(minutes, LENGTH_BUCKETS),
+        diversity = bucket(df["artists"].to_numpy(), ARTIST_BUCKETS),
+    )
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# Python-side equivalents of SQLite behaviour that computed results must match.
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+import pandas as pd
+
+def sql_round(x, digits):
+    # SQLite's ROUND() rounds the shortest decimal repr half away from zero, numpy rounds
+    # half-even on the binary value: they can only disagree on near-ties, redo those exactly
+    if isinstance(x, pd.Series):
+        v = x.to_numpy(dtype=float)
+        out = np.round(v, digits)
+        for i in np.flatnonzero(np.abs(v * 10.0**digits % 1.0 - 0.5) < 1e-6):
+            out[i] = sql_round(v[i], digits)
+        return pd.Series(out, index=x.index)
+    return float(Decimal(repr(float(x))).quantize(Decimal(1).scaleb(-digits), ROUND_HALF_UP))
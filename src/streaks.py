@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Listening streaks by run-length encoding of per-day activity.
+#
+# Activity is given as sorted (key, day) pairs, i.e. the set bits of one day bitmap
+# per key (key 0 for the global calendar, artist_id per artist). A run is a maximal
+# stretch of consecutive days under one key; all keys are encoded in the same
+# vectorized pass, so every artist's longest streak costs one sort, not one query.
+import numpy as np
+
+def runs(key, day):
+    # (key, day) sorted, unique -> start index and length of every run
+    new = np.ones(len(day), dtype=bool)
+    new[1:] = (key[1:] != key[:-1]) | (day[1:] - day[:-1] != 1)
+    starts = np.flatnonzero(new)
+    return starts, np.diff(np.append(starts, len(day)))
+
+def longest_streaks(key, day):
+    # Longest run per key as (key, first day, length) arrays; ties go to the earliest run
+    starts, lengths = runs(key, day)
+    run_key = key[starts]
+    order = np.lexsort((starts, -lengths, run_key))
+    best = order[np.append(True, run_key[order][1:] != run_key[order][:-1])]
+    return run_key[best], day[starts[best]], lengths[best]
+
+def contenders(length, k: int = 10):
+    # indices of the runs that can make a top-k list: all tied with the k-th longest
+    if len(length) <= k:
+        return np.arange(len(length))
+    return np.flatnonzero(length >= np.partition(length, -k)[-k])
+
+def top_streaks(df, k: int = 10):
+    # df with artistName, streak_days, first -> the k longest; ties go to the earliest
+    # start, then the name (the report and the dashboard list the same artists)
+    return df.sort_values(["streak_days", "first", "artistName"], ascending=[False, True, True]).head(k)
+
+def calendar_streaks(days):
+    # Sorted unique active days -> longest streak and longest gap between active days,
+    # each as (first day, length) or None
+    if not len(days):
+        return dict(active_days=0, span_days=0, longest_streak=None, longest_gap=None)
+    _, first, length = longest_streaks(np.zeros(len(days), dtype=np.int64), days)
+    gaps = np.diff(days) - 1
+    g = int(np.argmax(gaps)) if len(gaps) else 0
+    return dict(
+        active_days = len(days), span_days = int(days[-1] - days[0] + 1),
+        longest_streak = (int(first[0]), int(length[0])),
+        longest_gap = (int(days[g] + 1), int(gaps[g])) if len(gaps) and gaps[g] > 0 else None,
+    )
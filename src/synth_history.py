@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# Deterministic synthetic Spotify streaming history at any size.
+#
+# Artists and tracks-within-artist follow Zipf popularity, plays follow a
+# diurnal/weekly curve, and msPlayed mixes skips (<30s), partial and full plays
+# of per-track durations. The same seed always produces the same history.
+import json, pathlib, argparse, datetime as dt
+import numpy as np
+import import_data
+
+START = dt.date(2020, 1, 1)
+DAYS = 5 * 365
+TRACKS_PER_ARTIST = 30
+ROWS_PER_FILE = 10_000  # what Spotify's own export uses
+
+# relative listening by hour of day (local clock) and weekday (0 = Sunday)
+HOUR_WEIGHTS = np.array([3, 2, 1, .5, .3, .3, .8, 2.5, 4, 4, 3.5, 3.5,
+                         4, 4, 3.5, 3.5, 4, 5, 6, 6.5, 6.5, 6, 5, 4])
+WEEKDAY_WEIGHTS = np.array([1.2, .9, .95, .95, 1, 1.1, 1.3])
+SKIP_RATE, PARTIAL_RATE = .18, .10
+
+def zipf_p(n: int, s: float):
+    p = 1.0 / np.arange(1, n + 1) ** s
+    return p / p.sum()
+
+def default_artists(plays: int):
+    return max(50, int(2 * plays ** .5))
+
+class Catalogue:
+    # Artist/track names with Zipf popularity and per-track durations. Popularity
+    # ranks are shuffled so ids do not sort by popularity.
+    def __init__(self, n_artists: int, tracks_per_artist: int, rng):
+        self.tracks_per_artist = tracks_per_artist
+        # every 5th artist gets a Vietnamese name to exercise non-ASCII handling
+        self.artists = [f"Nghệ Sĩ {i}" if i % 5 == 0 else f"Artist {i}" for i in range(n_artists)]
+        self.artist_cdf = np.cumsum(rng.permutation(zipf_p(n_artists, 1.1)))
+        self.track_cdf = np.cumsum(zipf_p(tracks_per_artist, 1.2))
+        n = n_artists * tracks_per_artist
+        self.duration_ms = np.clip(rng.lognormal(np.log(210_000), .3, n), 60_000, 600_000).astype(np.int64)
+
+    def track_name(self, track: int):
+        return f"{self.artists[track // self.tracks_per_artist]} - Track {track % self.tracks_per_artist}"
+
+def iter_plays(plays: int, seed: int = 0, days: int = DAYS, artists: int | None = None,
+               tracks_per_artist: int = TRACKS_PER_ARTIST, batch: int = ROWS_PER_FILE):
+    # Yield (catalogue, ts_min, track, ms_played) batches in time order; ts_min is minutes since 1970-01-01
+    # one stream per concern, and fixed-width draws per play, so the history does
+    # not depend on the batch size it is read in
+    cat_rng, time_rng, track_rng, ms_rng = (np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(4))
+    cat = Catalogue(artists or default_artists(plays), tracks_per_artist, cat_rng)
+    first = (START - dt.date(1970, 1, 1)).days
+    day_w = WEEKDAY_WEIGHTS[(first + np.arange(days) + 4) % 7] * time_rng.gamma(2.0, .5, days)
+    per_day = time_rng.multinomial(plays, day_w / day_w.sum())
+    hour_p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+
+    def attach(ts):
+        k = len(ts)
+        r = track_rng.random((k, 2))
+        artist = np.minimum(np.searchsorted(cat.artist_cdf, r[:, 0], side="right"), len(cat.artists) - 1)
+        track = artist * tracks_per_artist + np.minimum(np.searchsorted(cat.track_cdf, r[:, 1], side="right"), tracks_per_artist - 1)
+        dur = cat.duration_ms[track]
+        u, f = ms_rng.random((k, 2)).T
+        ms = np.where(u < SKIP_RATE, (f * 30_000).astype(np.int64),
+                      np.where(u < SKIP_RATE + PARTIAL_RATE, (dur * f).astype(np.int64), dur))
+        return cat, ts, track, ms
+
+    buf, pending = [], 0
+    for d in np.flatnonzero(per_day):
+        n = per_day[d]
+        buf.append(np.sort((first + d) * 1440 + time_rng.choice(24, n, p=hour_p) * 60 + time_rng.integers(0, 60, n)))
+        pending += n
+        while pending >= batch:
+            ts = np.concatenate(buf)
+            buf, pending = [ts[batch:]], pending - batch
+            yield attach(ts[:batch])
+    if pending:
+        yield attach(np.concatenate(buf))
+
+def end_time(ts_min: int):
+    return (dt.datetime(1970, 1, 1) + dt.timedelta(minutes=int(ts_min))).strftime("%Y-%m-%d %H:%M")
+
+def write_history(out_dir: pathlib.Path, plays: int, seed: int = 0, rows_per_file: int = ROWS_PER_FILE, **kw):
+    # StreamingHistory_music_<n>.json files in Spotify's export format
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for i, (cat, ts, track, ms) in enumerate(iter_plays(plays, seed, batch=rows_per_file, **kw)):
+        recs = [{"endTime": end_time(t), "artistName": cat.artists[k // cat.tracks_per_artist],
+                 "trackName": cat.track_name(k), "msPlayed": int(m)} for t, k, m in zip(ts, track, ms)]
+        (out_dir / f"StreamingHistory_music_{i}.json").write_text(
+            json.dumps(recs, ensure_ascii=False, indent=2), encoding="utf-8")
+    return sorted(out_dir.glob("StreamingHistory_music_*.json"), key=import_data.export_order)
+
+def write_db(path: pathlib.Path, plays: int, seed: int = 0, **kw):
+    # Same history loaded straight into the star schema, skipping JSON, for sizes
+    # where writing and parsing the export would dwarf whatever is being measured
+    con, cur = import_data.connect(path)
+    cur.execute("BEGIN")
+    import_data.create_schema(cur)
+    loaded = False
+    for cat, ts, track, ms in iter_plays(plays, seed, batch=1_000_000, **kw):
+        if not loaded:
+            loaded = True
+            cur.executemany("INSERT INTO artists(artist_id, artistName) VALUES (?,?)",
+                            ((a + 1, name) for a, name in enumerate(cat.artists)))
+            cur.executemany("INSERT INTO tracks(track_id, artist_id, trackName) VALUES (?,?,?)",
+                            ((t + 1, t // cat.tracks_per_artist + 1, cat.track_name(t))
+                             for t in range(len(cat.duration_ms))))
+        day = ts // 1440
+        ym = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        facts = np.column_stack([ts, day, ts // 60 % 24, (day + 4) % 7, (1970 + ym // 12) * 100 + ym % 12 + 1,
+                                 track // cat.tracks_per_artist + 1, track + 1, ms])
+        cur.executemany("INSERT INTO plays(ts_min, day, hour, weekday, month, artist_id, track_id, msPlayed) "
+                        "VALUES (?,?,?,?,?,?,?,?)", facts.tolist())
+    # the derived tables rebuild() fills, so the stamped SCHEMA_VERSION holds
+    import_data.refresh_rollups(cur)
+    import_data.refresh_sketches(cur)
+    import_data.index_artists(cur)
+    import_data.create_indexes(cur)
+    import_data.refresh_sessions(cur)
+    import_data.refresh_transitions(cur)
+    cur.execute("COMMIT")
+    con.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Write a deterministic synthetic StreamingHistory export")
+    ap.add_argument("out", type=pathlib.Path, help="directory for StreamingHistory_music_*.json")
+    ap.add_argument("--plays", type=int, default=1_000_000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--days", type=int, default=DAYS)
+    ap.add_argument("--artists", type=int, default=None, help="default: 2*sqrt(plays)")
+    args = ap.parse_args()
+    paths = write_history(args.out, args.plays, args.seed, days=args.days, artists=args.artists)
+    print(f"Wrote {args.plays} plays to {len(paths)} files in {args.out}")
+
+if __name__ == "__main__":
+    main()
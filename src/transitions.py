@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Track -> track and artist -> artist transition counts, stored as CSR matrices.
+#
+# A transition is two consecutive plays of the same listening session (the second
+# starts at most the session gap after the first ended). Plays are streamed in play
+# order, counted per chunk with np.unique on src * n + dst keys, and the sorted keys
+# become CSR arrays directly: indptr (n + 1), indices (column per nonzero) and data
+# (count per nonzero). Each matrix is one row of `transitions` holding the three
+# arrays as zlib'd little-endian BLOBs; a row lookup is a slice, whatever n is.
+import sqlite3, zlib
+import numpy as np
+from sessions import SESSION_GAP_MIN
+
+CHUNK = 1 << 18  # plays per numpy pass
+KINDS = {"track": 2, "artist": 3}  # kind -> column of the plays rows read below
+
+class Transitions:
+    def __init__(self, indptr, indices, data):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.n = len(indptr) - 1
+
+    @classmethod
+    def from_counts(cls, n: int, keys, counts):
+        # keys = src * n + dst, sorted and unique
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+        return cls(indptr, (keys % n).astype(np.int32), counts.astype(np.int32))
+
+    def counts(self, n: int):
+        # back to (keys, counts) with keys for an n x n matrix (n >= self.n)
+        rows = np.repeat(np.arange(self.n, dtype=np.int64), np.diff(self.indptr))
+        return rows * n + self.indices, self.data.astype(np.int64)
+
+    def after(self, i: int, k: int = 10):
+        # the k most frequent successors of i as (ids, counts), ties by id
+        if not 0 <= i < self.n:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        ids, cnt = self.indices[lo:hi], self.data[lo:hi]
+        top = np.lexsort((ids, -cnt))[:k]
+        return ids[top].astype(np.int64), cnt[top].astype(np.int64)
+
+    def before(self, j: int, k: int = 10):
+        # the k most frequent predecessors of j: a column, i.e. one scan of indices
+        nz = np.flatnonzero(self.indices == j)
+        rows = np.searchsorted(self.indptr, nz, side="right") - 1
+        cnt = self.data[nz]
+        top = np.lexsort((rows, -cnt))[:k]
+        return rows[top].astype(np.int64), cnt[top].astype(np.int64)
+
+    def total_after(self, i: int) -> int:
+        return int(self.data[self.indptr[i]:self.indptr[i + 1]].sum()) if 0 <= i < self.n else 0
+
+    def total_before(self, j: int) -> int:
+        return int(self.data[self.indices == j].sum())
+
+def pack(a, dtype: str) -> bytes:
+    return zlib.compress(np.ascontiguousarray(a, dtype=dtype).tobytes(), 6)
+
+def unpack(blob: bytes, dtype: str):
+    return np.frombuffer(zlib.decompress(blob), dtype=dtype)
+
+def load(con, kind: str):
+    # the stored matrix for kind, or None (no table, or not built yet)
+    try:
+        row = con.execute("SELECT indptr, indices, data FROM transitions WHERE kind = ?", (kind,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return Transitions(unpack(row[0], "<i8"), unpack(row[1], "<i4"), unpack(row[2], "<i4")) if row else None
+
+def save(cur, kind: str, gap: int, m: Transitions):
+    cur.execute("INSERT OR REPLACE INTO transitions(kind, gap_min, n, nnz, indptr, indices, data) VALUES (?,?,?,?,?,?,?)",
+                (kind, gap, m.n, len(m.data), pack(m.indptr, "<i8"), pack(m.indices, "<i4"), pack(m.data, "<i4")))
+
+def merge(keys, counts):
+    # sum counts of equal keys across chunks
+    keys, inv = np.unique(np.concatenate(keys), return_inverse=True)
+    return keys, np.bincount(inv, weights=np.concatenate(counts)).astype(np.int64)
+
+def refresh_transitions(cur, gap: int = SESSION_GAP_MIN, since_rowid: int | None = None):
+    # Rebuild both matrices from plays. With since_rowid (an append: every play with a
+    # larger rowid is new and ends no earlier than the old ones) only transitions into
+    # the new plays are counted and added to the stored matrices, unless those were
+    # built with another gap.
+    stored = dict(cur.execute("SELECT kind, gap_min FROM transitions").fetchall())
+    frm = -1
+    if since_rowid is not None and all(stored.get(k) == gap for k in KINDS):
+        first = cur.execute("SELECT MIN(ts_min) FROM plays WHERE rowid > ?", (since_rowid,)).fetchone()[0]
+        if first is None:  # nothing appended: read no plays
+            frm = cur.execute("SELECT COALESCE(MAX(ts_min), 0) + 1 FROM plays").fetchone()[0]
+        else:  # from the minute before, so the first new play has its predecessor
+            prev = cur.execute("SELECT MAX(ts_min) FROM plays WHERE ts_min < ?", (first,)).fetchone()[0]
+            frm = first if prev is None else prev
+    else:
+        since_rowid = None
+    n = {"track": cur.execute("SELECT COALESCE(MAX(track_id), 0) + 1 FROM tracks").fetchone()[0],
+         "artist": cur.execute("SELECT COALESCE(MAX(artist_id), 0) + 1 FROM artists").fetchone()[0]}
+    acc = {k: ([], []) for k in KINDS}
+    if since_rowid is not None:
+        for k in KINDS:
+            m = load(cur, k)
+            for lst, a in zip(acc[k], m.counts(n[k])):
+                lst.append(a)
+    # own cursor: save() goes through cur; rowid keeps the export order within a minute
+    rows = cur.connection.execute("""
+        SELECT ts_min, msPlayed, track_id, artist_id, rowid FROM plays WHERE ts_min >= ? ORDER BY ts_min, rowid
+    """, (frm,))
+    carry = np.empty((0, 5), dtype=np.int64)
+    while chunk := rows.fetchmany(CHUNK):
+        buf = np.concatenate([carry, np.array(chunk, dtype=np.int64)])
+        ts, ms = buf[:, 0], buf[:, 1]
+        linked = ts[1:] - ms[1:] // 60000 - ts[:-1] <= gap
+        if since_rowid is not None:
+            linked &= buf[1:, 4] > since_rowid
+        for k, c in KINDS.items():
+            keys, counts = np.unique(buf[:-1, c][linked] * n[k] + buf[1:, c][linked], return_counts=True)
+            acc[k][0].append(keys)
+            acc[k][1].append(counts)
+        carry = buf[-1:]
+    for k in KINDS:
+        keys, counts = merge(*acc[k]) if acc[k][0] else (np.empty(0, dtype=np.int64),) * 2
+        save(cur, k, gap, Transitions.from_counts(n[k], keys, counts))
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
-import sqlite3, os, io, zipfile, pathlib
+import sqlite3, os, io, sys, json, zipfile, pathlib, threading, time, hashlib, tempfile, contextlib
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import streamlit as st
 
 st.set_page_config(page_title="Spotify SQL Insights", layout="wide")
+rerun_start = time.perf_counter()
 
 ROOT = pathlib.Path(__file__).resolve().parent
 
@@ -15,36 +17,287 @@ PARENT_DB  = ROOT.parent / "db" / "spotify.db"
 if (not DEFAULT_DB.exists()) and PARENT_DB.exists():
     DEFAULT_DB = PARENT_DB
 
+sys.path.insert(0, str(ROOT.parent / "src"))
+from import_data import is_legacy, upgrade_legacy
+from date_cube import DateCube
+from artist_search import search as search_artists
+from sessions import summarize as summarize_sessions
+from streaks import calendar_streaks, contenders, longest_streaks, top_streaks
+import transitions
+from hll import DaySketches
+
+# Cached query results are bounded by their in-memory size (pandas deep usage)
+QUERY_CACHE_MB = 64
+# Read-only connections to the bundled DB: at most POOL_SIZE queries run at once,
+# each connection memory-maps up to DB_MMAP_MB of the file and caches DB_CACHE_MB of pages
+POOL_SIZE = 8
+DB_MMAP_MB = 256
+DB_CACHE_MB = 16
+
+def db_fingerprint(db_path: str | os.PathLike):
+    # The importer replaces the file (new inode) on rebuild and rewrites it in place
+    # on --incremental, so inode + size + mtime change whenever the data does
+    s = os.stat(db_path)
+    return (str(pathlib.Path(db_path).resolve()), s.st_ino, s.st_size, s.st_mtime_ns)
+
+class ConnectionPool:
+    # Read-only connections to one database, checked out per query so concurrent
+    # sessions run side by side instead of queueing on one shared connection.
+    # Tracks how busy the pool is and how long checkouts waited for a free slot.
+    def __init__(self, uri: str, size: int, anchor=None):
+        self.uri, self.size = uri, size
+        self.anchor = anchor  # keeps a shared in-memory DB alive
+        self.idle = []        # LIFO, so the warmest connection is reused first
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.opened = self.busy = self.peak = self.checkouts = self.waits = 0
+        self.wait_s = 0.0
+        self.closed = False
+
+    def _open(self):
+        con = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        for pragma in [f"mmap_size={DB_MMAP_MB << 20}", f"cache_size=-{DB_CACHE_MB << 10}",
+                       "query_only=ON", "busy_timeout=3000"]:
+            con.execute(f"PRAGMA {pragma};")
+        return con
+
+    @contextlib.contextmanager
+    def connection(self):
+        t0 = time.perf_counter()
+        waited = not self.slots.acquire(blocking=False)
+        if waited:
+            self.slots.acquire()
+        with self.lock:
+            if self.closed:  # replaced since the caller picked it up
+                self.slots.release()
+                raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool.")
+            self.checkouts += 1
+            self.busy += 1
+            self.peak = max(self.peak, self.busy)
+            if waited:
+                self.waits += 1
+                self.wait_s += time.perf_counter() - t0
+            con = self.idle.pop() if self.idle else None
+        try:
+            if con is None:
+                con = self._open()
+                with self.lock:
+                    self.opened += 1
+            yield con
+        finally:
+            with self.lock:
+                self.busy -= 1
+                if con is not None and self.closed:
+                    con.close()
+                elif con is not None:
+                    self.idle.append(con)
+                last = self.closed and not self.busy
+            self.slots.release()
+            if last:
+                self.release_anchor()
+
+    def close(self):
+        # idle connections now, busy ones when they are checked back in
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            last = not self.busy
+        for con in idle:
+            con.close()
+        if last:
+            self.release_anchor()
+
+    def release_anchor(self):
+        # only once nothing is checked out: a connection opened mid-close still sees the
+        # shared in-memory DB, which goes with its last connection
+        with self.lock:
+            anchor, self.anchor = self.anchor, None
+        if anchor is not None:
+            anchor.close()
+
+    def stats(self):
+        avg = self.wait_s / self.waits * 1000 if self.waits else 0.0
+        return (f"Connections: {self.busy}/{self.size} busy (peak {self.peak}), {self.opened} open; "
+                f"{self.waits} of {self.checkouts} queries waited, avg {avg:.0f} ms")
+
 @st.cache_resource(show_spinner=False)
-def connect_sqlite(db_path: str | os.PathLike):
-    # Open read-only and allow use across Streamlit threads
-    uri = f"file:{pathlib.Path(db_path).as_posix()}?mode=ro&cache=shared"
-    con = sqlite3.connect(uri, uri=True, check_same_thread=False)
-    con.execute("PRAGMA busy_timeout=3000;")
+def pools():
+    # db path -> (fingerprint, ConnectionPool), shared by every session
+    return {}, threading.Lock()
+
+def connect_sqlite(db_path: str | os.PathLike, fingerprint=None):
+    # The pool for db_path. A swapped DB (new fingerprint) gets a fresh pool and the
+    # old one is closed, so its connections, mmaps and legacy copy are freed.
+    held, lock = pools()
+    key = str(pathlib.Path(db_path).resolve())
+    with lock:
+        old = held.get(key)
+        if old is not None and old[0] == fingerprint:
+            return old[1]
+        pool = open_pool(db_path, fingerprint)
+        held[key] = (fingerprint, pool)
+    if old is not None:
+        old[1].close()
+    return pool
+
+def open_pool(db_path: str | os.PathLike, fingerprint=None):
+    # Pool of read-only connections usable from any Streamlit thread.
+    # No shared cache: each connection has its own page cache and mmap, so readers never
+    # take table locks against each other.
+    uri = f"file:{pathlib.Path(db_path).as_posix()}?mode=ro"
+    con = sqlite3.connect(uri, uri=True)
+    if not is_legacy(con):
+        con.close()
+        return ConnectionPool(uri, POOL_SIZE)
+    # DB from the old single-table importer: upgrade an in-memory copy that the
+    # pool's connections share by name
+    mem_uri = f"file:legacy_{hashlib.sha256(repr(fingerprint or db_path).encode()).hexdigest()[:16]}?mode=memory&cache=shared"
+    mem = sqlite3.connect(mem_uri, uri=True, check_same_thread=False)
+    con.backup(mem)
+    con.close()
+    upgrade_legacy(mem)
+    return ConnectionPool(mem_uri, POOL_SIZE, anchor=mem)
+
+def open_upload(data: bytes):
+    # Private in-memory copy of an uploaded DB: no file on disk, nothing shared with
+    # other sessions, and freed with the session that holds it
+    con = sqlite3.connect(":memory:", check_same_thread=False)
+    if hasattr(con, "deserialize"):  # Python 3.11+
+        con.deserialize(data)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "upload.db"
+            path.write_bytes(data)
+            src = sqlite3.connect(path)
+            src.backup(con)
+            src.close()
+    upgrade_legacy(con)
+    con.execute("PRAGMA query_only=ON;")
     return con
 
+class QueryCache:
+    # LRU of query results keyed on (DB fingerprint, normalized SQL, params),
+    # shared by every session of this server process
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return hit[0]
+
+    def put(self, key, df: pd.DataFrame):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (df, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+
+@st.cache_resource(show_spinner=False)
+def query_cache():
+    return QueryCache(QUERY_CACHE_MB << 20)
+
+@contextlib.contextmanager
+def checkout(con):
+    # (ConnectionPool is redefined on every rerun, so test for the stable type)
+    if isinstance(con, sqlite3.Connection):
+        yield con  # this session's uploaded DB
+        return
+    try:
+        with con.connection() as c:
+            yield c
+    except sqlite3.ProgrammingError:
+        if not con.closed:
+            raise
+        st.rerun()  # the DB was swapped after this rerun picked up the pool: start over
+
 def run_query(con, q: str, params=None) -> pd.DataFrame:
-    return pd.read_sql_query(q, con, params=params)
+    key = (db_fp, " ".join(q.split()), tuple(params or ()))
+    cache = query_cache()
+    df = cache.get(key)
+    if df is None:
+        with checkout(con) as c:
+            df = pd.read_sql_query(q, c, params=params)
+        cache.put(key, df)
+    cache_stats.caption(f"Query cache: {cache.hits} hits / {cache.misses} misses, "
+                        f"{len(cache.entries)} results ({cache.bytes / 2**20:.1f} MB)")
+    # callers may add columns; never hand out the cached frame itself
+    return df.copy()
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def date_cube(_con, fingerprint):
+    # Prefix sums per day, built on first use for each DB: habit charts, skip stats and
+    # top-artist lists for any date range come from array lookups instead of SQL
+    with checkout(_con) as c:
+        return DateCube(c)
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def artist_matches(_con, fingerprint, text: str):
+    # one indexed lookup per distinct query; every keystroke rerun after that is a dict hit
+    with checkout(_con) as c:
+        return search_artists(c, text)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def transition_graph(_con, fingerprint):
+    # the stored CSR matrices, decompressed once per DB; lookups are then array slices
+    with checkout(_con) as c:
+        return {k: transitions.load(c, k) for k in transitions.KINDS}
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def day_sketches(_con, fingerprint):
+    # per-day HyperLogLog registers, or None for databases built before they existed
+    try:
+        with checkout(_con) as c:
+            return DaySketches(c)
+    except sqlite3.OperationalError:
+        return None
 
 # Sidebar: choose DB source
 st.sidebar.title("Data Source")
 db_choice = st.sidebar.radio("SQLite database", ["Use bundled db/spotify.db", "Upload .db file"])
 
-con = None
+con, db_fp = None, None
 if db_choice == "Use bundled db/spotify.db":
     if DEFAULT_DB.exists():
-        con = connect_sqlite(DEFAULT_DB)
+        db_fp = db_fingerprint(DEFAULT_DB)
+        con = connect_sqlite(DEFAULT_DB, db_fp)
         st.sidebar.success(f"Connected: {DEFAULT_DB.name}")
     else:
         st.sidebar.error("db/spotify.db not found. Use upload option or copy your DB into /db.")
 else:
     uploaded = st.sidebar.file_uploader("Upload a SQLite .db", type=["db","sqlite","sqlite3"])
     if uploaded is not None:
-        tmp_path = ROOT / "uploaded.db"
-        with open(tmp_path, "wb") as f:
-            f.write(uploaded.getbuffer())
-        con = connect_sqlite(tmp_path)
-        st.sidebar.success("Uploaded DB connected.")
+        # deserialize once per upload; reruns reuse this session's connection. The fingerprint
+        # is the content hash, so sessions uploading the same file share cached results.
+        held = st.session_state.get("upload")
+        if held is None or held[0] != uploaded.file_id:
+            if held is not None:
+                held[1].close()
+            data = uploaded.getvalue()
+            try:
+                held = (uploaded.file_id, open_upload(data), ("upload", hashlib.sha256(data).hexdigest()))
+            except sqlite3.DatabaseError as e:
+                st.session_state.pop("upload", None)
+                st.sidebar.error(f"Not a usable SQLite database: {e}")
+                st.stop()
+            st.session_state["upload"] = held
+        _, con, db_fp = held
+        st.sidebar.success("Uploaded DB loaded into memory.")
+    elif "upload" in st.session_state:
+        st.session_state.pop("upload")[1].close()
 
 st.title("🎧 Spotify — SQL Insights (Streamlit)")
 
@@ -52,11 +305,15 @@ if con is None:
     st.info("Choose a database in the left sidebar to begin.")
     st.stop()
 
+cache_stats = st.sidebar.empty()
+pool_stats = st.sidebar.empty()
+rerun_stats = st.sidebar.empty()
+
 # ------------------------------------------------------------
 # 🌍 Global date range filter (applies to every tab)
 # ------------------------------------------------------------
-date_bounds = pd.read_sql_query(
-    "SELECT date(min(endTime)) AS min_d, date(max(endTime)) AS max_d FROM listens;", con
+date_bounds = run_query(con,
+    "SELECT date(min(day) * 86400, 'unixepoch') AS min_d, date(max(day) * 86400, 'unixepoch') AS max_d FROM daily_rollup;"
 )
 min_d = pd.to_datetime(date_bounds.iloc[0]["min_d"]).date()
 max_d = pd.to_datetime(date_bounds.iloc[0]["max_d"]).date()
@@ -66,46 +323,80 @@ start_end = st.sidebar.date_input("Date range", (min_d, max_d))
 if not isinstance(start_end, (list, tuple)) or len(start_end) == 1:
     start_end = (start_end[0] if isinstance(start_end, (list, tuple)) else start_end, start_end)
 start_d, end_d = [pd.to_datetime(x).date() for x in (start_end[0], start_end[1])]
+exact_distinct = st.sidebar.checkbox("Exact unique counts", value=False,
+                                     help="Count distinct artists/tracks in SQL instead of merging "
+                                          "per-day HyperLogLog sketches (about ±2%, much faster on long ranges)")
 
-def between_clause(alias: str = ""):
-    col = (alias + "." if alias else "") + "endTime"
-    return f"date({col}) BETWEEN ? AND ?", (str(start_d), str(end_d))
+EPOCH = pd.Timestamp("1970-01-01").date()
 
-# Single tabs list (includes Gallery)
-tabs = st.tabs(["Overview", "Artists", "Tracks", "Habits", "Discovery", "Gallery"])
+def between_clause(alias: str = ""):
+    # day is days since 1970-01-01, so the range filter is an index range scan
+    col = (alias + "." if alias else "") + "day"
+    return f"{col} BETWEEN ? AND ?", ((start_d - EPOCH).days, (end_d - EPOCH).days)
+
+lo_day, hi_day = (start_d - EPOCH).days, (end_d - EPOCH).days
+
+def unique_counts(lo: int, hi: int):
+    # (unique artists, unique tracks, approximate?) for an inclusive day range
+    sketches = None if exact_distinct else day_sketches(con, db_fp)
+    if sketches is not None:
+        return *sketches.distinct(lo, hi), True
+    u = run_query(con, """
+        SELECT COUNT(DISTINCT r.artist_id) AS artists, COUNT(DISTINCT t.trackName) AS tracks
+        FROM daily_rollup r JOIN tracks t USING(track_id)
+        WHERE r.day BETWEEN ? AND ?;
+    """, (lo, hi)).iloc[0]
+    return int(u["artists"]), int(u["tracks"]), False
+
+# One view at a time: unlike st.tabs, only the selected view runs its queries and figures
+VIEWS = ["Overview", "Artists", "Tracks", "Habits", "Discovery", "Flow", "Gallery"]
+view = st.radio("View", VIEWS, horizontal=True, key="view", label_visibility="collapsed")
 
 # -------- Overview --------
-with tabs[0]:
+if view == "Overview":
     # HHI (Loyalist vs Explorer)
     st.subheader("Loyalist vs Explorer (Artist Concentration)")
     clause, params = between_clause()
     hhi = run_query(con, f"""
       WITH per_artist AS (
-        SELECT artistName, SUM(msPlayed) AS ms
-        FROM listens
+        SELECT artist_id, SUM(ms) AS ms
+        FROM daily_rollup
         WHERE {clause}
-        GROUP BY artistName
+        GROUP BY artist_id
       ),
       tot AS (SELECT SUM(ms) AS t FROM per_artist)
       SELECT SUM( (1.0*ms/t)*(1.0*ms/t) ) AS hhi FROM per_artist, tot;
     """, params)
     score = float(hhi.iloc[0]["hhi"]) if not hhi.empty else 0.0
     label = "Explorer" if score < 0.05 else ("Balanced" if score < 0.12 else "Loyalist")
-    st.metric("HHI (0–1)", f"{score:.3f}")
-    st.caption(f"Lower = more variety. You lean **{label}** in this date range.")
+    n_artists, n_tracks, approx = unique_counts(lo_day, hi_day)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("HHI (0–1)", f"{score:.3f}")
+    c2.metric("Unique artists", f"{'≈' if approx else ''}{n_artists:,}")
+    c3.metric("Unique tracks", f"{'≈' if approx else ''}{n_tracks:,}")
+    st.caption(f"Lower = more variety. You lean **{label}** in this date range."
+               + (" Unique counts are HyperLogLog estimates (about ±2%)." if approx else ""))
 
     colA, colB = st.columns([1,1])
     with colA:
         st.subheader("Top Artists (by hours)")
-        clause, params = between_clause()
-        df_top_artists = run_query(con, f"""
-            SELECT artistName, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened, COUNT(*) AS plays
-            FROM listens
-            WHERE {clause}
-            GROUP BY artistName
-            ORDER BY hours_listened DESC, plays DESC
-            LIMIT 15;
-        """, params=params)
+        df_top_artists = date_cube(con, db_fp).top_artists(lo_day, hi_day, 15)
+        if df_top_artists is not None:
+            df_top_artists = df_top_artists[["artistName", "hours_listened", "plays"]]
+        else:  # an artist outside the cube could make this range's top 15
+            clause, params = between_clause()
+            df_top_artists = run_query(con, f"""
+                WITH per_artist AS (
+                  SELECT artist_id, SUM(ms) AS ms, SUM(plays) AS plays
+                  FROM daily_rollup
+                  WHERE {clause}
+                  GROUP BY artist_id
+                )
+                SELECT a.artistName, ROUND(ms/3600000.0, 2) AS hours_listened, plays
+                FROM per_artist JOIN artists a USING(artist_id)
+                ORDER BY hours_listened DESC, plays DESC, a.artistName
+                LIMIT 15;
+            """, params=params)
         st.dataframe(df_top_artists, use_container_width=True, hide_index=True)
         if not df_top_artists.empty:
             fig, ax = plt.subplots(figsize=(6,5))
@@ -119,11 +410,15 @@ with tabs[0]:
         st.subheader("Top Tracks (by hours)")
         clause, params = between_clause()
         df_top_tracks = run_query(con, f"""
-            SELECT trackName, artistName, ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened, COUNT(*) AS plays
-            FROM listens
-            WHERE {clause}
-            GROUP BY trackName, artistName
-            ORDER BY hours_listened DESC, plays DESC
+            WITH per_track AS (
+              SELECT track_id, SUM(ms) AS ms, SUM(plays) AS plays
+              FROM daily_rollup
+              WHERE {clause}
+              GROUP BY track_id
+            )
+            SELECT t.trackName, a.artistName, ROUND(ms/3600000.0, 2) AS hours_listened, plays
+            FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id)
+            ORDER BY hours_listened DESC, plays DESC, t.trackName, a.artistName
             LIMIT 15;
         """, params=params)
         st.dataframe(df_top_tracks, use_container_width=True, hide_index=True)
@@ -136,39 +431,46 @@ with tabs[0]:
             st.pyplot(fig, use_container_width=True)
 
 # -------- Artists --------
-with tabs[1]:
+elif view == "Artists":
     st.subheader("Artist Binges by Month (share %)")
     clause, params = between_clause()
     binge = run_query(con, f"""
         WITH month_artist AS (
-          SELECT strftime('%Y-%m', endTime) AS month, artistName, SUM(msPlayed) AS ms_month_artist
-          FROM listens
+          SELECT month, artist_id, SUM(ms) AS ms_month_artist
+          FROM daily_rollup
           WHERE {clause}
-          GROUP BY month, artistName
+          GROUP BY month, artist_id
         ),
         month_total AS (
           SELECT month, SUM(ms_month_artist) AS ms_month_total FROM month_artist GROUP BY month
         )
-        SELECT m.month, m.artistName, ROUND(100.0 * m.ms_month_artist / t.ms_month_total, 1) AS month_share_pct
+        SELECT printf('%d-%02d', m.month / 100, m.month % 100) AS month, a.artistName,
+               ROUND(100.0 * m.ms_month_artist / t.ms_month_total, 1) AS month_share_pct
         FROM month_artist m
         JOIN month_total t USING(month)
+        JOIN artists a USING(artist_id)
         WHERE m.ms_month_artist >= 30*60*1000
-        ORDER BY m.month, month_share_pct DESC;
+        ORDER BY m.month, month_share_pct DESC, a.artistName;
     """, params)
     st.dataframe(binge, use_container_width=True, hide_index=True)
     st.caption("Artists who captured ≥30 minutes in a month, showing their share of that month's listening.")
 
     st.divider()
     st.subheader("Search an Artist")
-    name = st.text_input("Artist name (exact match recommended)")
-    if name:
+    text = st.text_input("Artist name", placeholder="e.g. son tung, den vau")
+    matches = artist_matches(con, db_fp, text) if text.strip() else []
+    if text.strip() and not matches:
+        st.info("No artist matches that name.")
+    if matches:
+        # autocomplete: best match preselected, the rest one click away
+        artist_id, name = st.selectbox("Matches", matches, format_func=lambda m: m[1])
         clause, params = between_clause()
         q = f"""
-        SELECT date(endTime) AS date, ROUND(SUM(msPlayed)/3600000.0,2) AS hours
-        FROM listens WHERE artistName = ? AND {clause}
-        GROUP BY date ORDER BY date;
+        SELECT date(day * 86400, 'unixepoch') AS date, ROUND(SUM(ms)/3600000.0,2) AS hours
+        FROM daily_rollup WHERE artist_id = ? AND {clause}
+        GROUP BY day ORDER BY day;
         """
-        df = run_query(con, q, params=[name, *params])
+        df = run_query(con, q, params=[artist_id, *params])
         st.dataframe(df, use_container_width=True, hide_index=True)
         if not df.empty:
             fig, ax = plt.subplots(figsize=(8,3))
@@ -179,25 +481,36 @@ with tabs[1]:
             st.pyplot(fig, use_container_width=True)
 
     # What-if: remove #1 artist in the selected range
+    cube = date_cube(con, db_fp)
     clause, params = between_clause()
-    top1_df = run_query(con, f"""
-        SELECT artistName, SUM(msPlayed) AS ms
-        FROM listens
-        WHERE {clause}
-        GROUP BY artistName
-        ORDER BY ms DESC LIMIT 1;
-    """, params)
+    top1_df = cube.top_artists(lo_day, hi_day, 1, order=("ms", "artistName"))
+    if top1_df is None:
+        top1_df = run_query(con, f"""
+            SELECT a.artist_id, a.artistName, SUM(r.ms) AS ms
+            FROM daily_rollup r JOIN artists a USING(artist_id)
+            WHERE {clause}
+            GROUP BY r.artist_id
+            ORDER BY ms DESC LIMIT 1;
+        """, params)
     if not top1_df.empty:
-        top1 = top1_df.iloc[0]["artistName"]
+        top1, top1_id = top1_df.iloc[0]["artistName"], int(top1_df.iloc[0]["artist_id"])
         st.subheader("What if I remove my #1 artist?")
-        df_wo = run_query(con, f"""
-            SELECT artistName, ROUND(SUM(msPlayed)/3600000.0,2) AS hours_listened
-            FROM listens
-            WHERE {clause} AND artistName <> ?
-            GROUP BY artistName
-            ORDER BY hours_listened DESC
-            LIMIT 5;
-        """, params + (top1,))
+        df_wo = cube.top_artists(lo_day, hi_day, 5, order=("hours_listened", "artistName"), exclude=top1_id)
+        if df_wo is not None:
+            df_wo = df_wo[["artistName", "hours_listened"]]
+        else:
+            df_wo = run_query(con, f"""
+                WITH per_artist AS (
+                  SELECT artist_id, SUM(ms) AS ms
+                  FROM daily_rollup
+                  WHERE {clause} AND artist_id <> ?
+                  GROUP BY artist_id
+                )
+                SELECT a.artistName, ROUND(ms/3600000.0,2) AS hours_listened
+                FROM per_artist JOIN artists a USING(artist_id)
+                ORDER BY hours_listened DESC, a.artistName
+                LIMIT 5;
+            """, params + (top1_id,))
         if not df_wo.empty:
             st.write(
                 f"Without **{top1}**, your new #1 is **{df_wo.iloc[0]['artistName']}** "
@@ -206,48 +519,36 @@ with tabs[1]:
             st.dataframe(df_wo, use_container_width=True, hide_index=True)
 
 # -------- Tracks --------
-with tabs[2]:
+elif view == "Tracks":
     left, right = st.columns([1,1])
     with left:
         st.subheader("Most Replayed Tracks (>=3 sessions)")
         clause, params = between_clause()
         top_rep = run_query(con, f"""
-            SELECT trackName, artistName, COUNT(*) AS play_sessions, ROUND(SUM(msPlayed)/60000.0,1) AS minutes_listened
-            FROM listens
-            WHERE {clause}
-            GROUP BY trackName, artistName
-            HAVING play_sessions >= 3
-            ORDER BY play_sessions DESC, minutes_listened DESC
+            WITH per_track AS (
+              SELECT track_id, SUM(plays) AS play_sessions, SUM(ms) AS ms
+              FROM daily_rollup
+              WHERE {clause}
+              GROUP BY track_id
+              HAVING play_sessions >= 3
+            )
+            SELECT t.trackName, a.artistName, play_sessions, ROUND(ms/60000.0,1) AS minutes_listened
+            FROM per_track JOIN tracks t USING(track_id) JOIN artists a USING(artist_id)
+            ORDER BY play_sessions DESC, minutes_listened DESC, t.trackName, a.artistName
             LIMIT 50;
         """, params)
         st.dataframe(top_rep, use_container_width=True, hide_index=True)
 
     with right:
         st.subheader("Skip Behavior (proxy)")
-        clause, params = between_clause()
-        skips = run_query(con, f"""
-            SELECT
-              COUNT(*) AS total_plays,
-              SUM(CASE WHEN msPlayed < 30000 THEN 1 ELSE 0 END) AS plays_lt_30s,
-              ROUND(100.0 * SUM(CASE WHEN msPlayed < 30000 THEN 1 ELSE 0 END) / COUNT(*), 1) AS pct_lt_30s,
-              SUM(CASE WHEN msPlayed < 60000 THEN 1 ELSE 0 END) AS plays_lt_60s,
-              ROUND(100.0 * SUM(CASE WHEN msPlayed < 60000 THEN 1 ELSE 0 END) / COUNT(*), 1) AS pct_lt_60s
-            FROM listens
-            WHERE {clause};
-        """, params)
+        skips = date_cube(con, db_fp).skips(lo_day, hi_day)
         st.dataframe(skips, use_container_width=True, hide_index=True)
 
 # -------- Habits --------
-with tabs[3]:
+elif view == "Habits":
+    cube = date_cube(con, db_fp)
     st.subheader("Listening by Hour of Day")
-    clause, params = between_clause()
-    by_hour = run_query(con, f"""
-        SELECT CAST(strftime('%H', endTime) AS INTEGER) AS hour,
-               ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened
-        FROM listens
-        WHERE {clause}
-        GROUP BY hour ORDER BY hour;
-    """, params)
+    by_hour = cube.by_hour(lo_day, hi_day)
     fig, ax = plt.subplots(figsize=(8,3))
     if not by_hour.empty:
         ax.plot(by_hour["hour"], by_hour["hours_listened"], marker="o")
@@ -256,17 +557,7 @@ with tabs[3]:
     st.pyplot(fig, use_container_width=True)
 
     st.subheader("Listening by Weekday")
-    clause, params = between_clause()
-    by_wd = run_query(con, f"""
-        SELECT CASE strftime('%w', endTime)
-            WHEN '0' THEN 'Sun' WHEN '1' THEN 'Mon' WHEN '2' THEN 'Tue'
-            WHEN '3' THEN 'Wed' WHEN '4' THEN 'Thu' WHEN '5' THEN 'Fri'
-            WHEN '6' THEN 'Sat' END AS weekday,
-            ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened
-        FROM listens
-        WHERE {clause}
-        GROUP BY strftime('%w', endTime) ORDER BY strftime('%w', endTime);
-    """, params)
+    by_wd = cube.by_weekday(lo_day, hi_day)
     fig2, ax2 = plt.subplots(figsize=(6,3))
     if not by_wd.empty:
         ax2.bar(by_wd["weekday"], by_wd["hours_listened"])
@@ -276,15 +567,29 @@ with tabs[3]:
 
     st.subheader("Monthly Trend")
     clause, params = between_clause()
-    by_mon = run_query(con, f"""
-        SELECT strftime('%Y-%m', endTime) AS month,
-               ROUND(SUM(msPlayed)/3600000.0, 2) AS hours_listened,
-               COUNT(DISTINCT artistName) AS unique_artists,
-               COUNT(DISTINCT trackName) AS unique_tracks
-        FROM listens
-        WHERE {clause}
-        GROUP BY month ORDER BY month;
-    """, params)
+    if exact_distinct or day_sketches(con, db_fp) is None:
+        by_mon = run_query(con, f"""
+            SELECT printf('%d-%02d', r.month / 100, r.month % 100) AS month,
+                   ROUND(SUM(ms)/3600000.0, 2) AS hours_listened,
+                   COUNT(DISTINCT r.artist_id) AS unique_artists,
+                   COUNT(DISTINCT t.trackName) AS unique_tracks
+            FROM daily_rollup r JOIN tracks t USING(track_id)
+            WHERE {clause}
+            GROUP BY r.month ORDER BY r.month;
+        """, params)
+    else:
+        # additive columns from SQL, distinct counts from each month's merged day sketches
+        by_mon = run_query(con, f"""
+            SELECT printf('%d-%02d', month / 100, month % 100) AS month,
+                   ROUND(SUM(ms)/3600000.0, 2) AS hours_listened, MIN(day) AS lo, MAX(day) AS hi
+            FROM daily_rollup
+            WHERE {clause}
+            GROUP BY daily_rollup.month ORDER BY daily_rollup.month;
+        """, params)
+        u = [day_sketches(con, db_fp).distinct(lo, hi) for lo, hi in zip(by_mon.pop("lo"), by_mon.pop("hi"))]
+        by_mon["unique_artists"] = [a for a, _ in u]
+        by_mon["unique_tracks"] = [t for _, t in u]
+        st.caption("Unique counts are HyperLogLog estimates (about ±2%); tick *Exact unique counts* in the sidebar for exact ones.")
     st.dataframe(by_mon, use_container_width=True, hide_index=True)
     if not by_mon.empty:
         fig3, ax3 = plt.subplots(figsize=(10,3))
@@ -296,22 +601,9 @@ with tabs[3]:
 
     # 🔥 Hour × Weekday Heatmap
     st.subheader("Hour × Weekday Heatmap")
-    clause, params = between_clause()
-    hm = run_query(con, f"""
-        SELECT CAST(strftime('%H', endTime) AS INTEGER) AS hour,
-               strftime('%w', endTime) AS w,
-               SUM(msPlayed)/3600000.0 AS hours
-        FROM listens
-        WHERE {clause}
-        GROUP BY w, hour;
-    """, params)
-    if not hm.empty:
+    if not by_hour.empty:
         fig, ax = plt.subplots(figsize=(10,4))
-        order = ['1','2','3','4','5','6','0']  # Mon..Sun
-        mat = np.zeros((7,24))
-        for i, w in enumerate(order):
-            sub = hm[hm["w"]==w].set_index("hour")["hours"].to_dict()
-            mat[i] = [sub.get(h,0.0) for h in range(24)]
+        mat = cube.weekday_hour_hours(lo_day, hi_day)[[1, 2, 3, 4, 5, 6, 0]]  # Mon..Sun
         im = ax.imshow(mat, aspect="auto")
         ax.set_yticks(range(7)); ax.set_yticklabels(["Mon","Tue","Wed","Thu","Fri","Sat","Sun"])
         ax.set_xticks(range(0,24,2)); ax.set_xlabel("Hour of Day")
@@ -320,8 +612,63 @@ with tabs[3]:
         fig.tight_layout()
         st.pyplot(fig, use_container_width=True)
 
+    st.subheader("Listening Sessions")
+    if run_query(con, "SELECT name FROM sqlite_master WHERE name = 'sessions';").empty:
+        st.info("This database has no sessions table; rebuild it with src/import_data.py.")
+    else:
+        gap = run_query(con, "SELECT value FROM settings WHERE key = 'session_gap_min';")
+        clause, params = between_clause()
+        s = summarize_sessions(run_query(con, f"""
+            SELECT start_min, end_min, plays, ms, artists FROM sessions WHERE {clause};
+        """, params))
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Sessions", f"{s['sessions']:,}")
+        c2.metric("Median length", f"{s['median_minutes']:.0f} min")
+        c3.metric("Avg artists / session", f"{s['mean_artists']:.1f}")
+        c4.metric("Single-artist sessions", f"{s['pct_single_artist']}%")
+        if s["sessions"]:
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,3))
+            ax1.bar(s["lengths"]["bucket"], s["lengths"]["sessions"])
+            ax1.set_xlabel("Session length"); ax1.set_ylabel("Sessions")
+            ax1.tick_params(axis="x", rotation=30)
+            ax2.bar(s["diversity"]["bucket"], s["diversity"]["sessions"])
+            ax2.set_xlabel("Distinct artists"); ax2.set_ylabel("Sessions")
+            fig.tight_layout()
+            st.pyplot(fig, use_container_width=True)
+        gap_min = gap.iloc[0]["value"] if not gap.empty else "?"
+        st.caption(f"A session is a run of plays with at most {gap_min} minutes of silence between them "
+                   "(set with `import_data.py --session-gap`). Sessions are counted on the day they start.")
+
+    st.subheader("Streaks")
+    clause, params = between_clause()
+    pairs = run_query(con, f"""
+        SELECT DISTINCT artist_id, day FROM daily_rollup WHERE {clause} ORDER BY artist_id, day;
+    """, params).to_numpy(dtype=np.int64).reshape(-1, 2)
+    cal = calendar_streaks(np.unique(pairs[:, 1]))
+    as_date = lambda d: str(np.datetime64(int(d), "D"))
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Days with listening", f"{cal['active_days']} / {cal['span_days']}")
+    for col, label, run in [(c2, "Longest streak", cal["longest_streak"]), (c3, "Longest break", cal["longest_gap"])]:
+        col.metric(label, f"{run[1]} days" if run else "–",
+                   help=f"{as_date(run[0])} → {as_date(run[0] + run[1] - 1)}" if run else None)
+    if len(pairs):
+        artist, first, length = longest_streaks(pairs[:, 0], pairs[:, 1])
+        # names only for the artists tied with the 10th longest streak, then the report's order
+        c = contenders(length)
+        names = dict(run_query(con, """
+            SELECT artist_id, artistName FROM artists WHERE artist_id IN (SELECT value FROM json_each(?));
+        """, [json.dumps(artist[c].tolist())]).to_numpy())
+        top = top_streaks(pd.DataFrame({"artistName": [names[a] for a in artist[c]],
+                                        "streak_days": length[c], "first": first[c]}))
+        st.dataframe(pd.DataFrame({
+            "artistName": top["artistName"].to_numpy(), "streak_days": top["streak_days"].to_numpy(),
+            "from": [as_date(d) for d in top["first"]],
+            "to": [as_date(d + n - 1) for d, n in zip(top["first"], top["streak_days"])],
+        }), use_container_width=True, hide_index=True)
+        st.caption("Longest run of consecutive days with at least one play of each artist, within the selected range.")
+
 # -------- Discovery --------
-with tabs[4]:
+elif view == "Discovery":
     st.subheader("New Artists Over Time (Cumulative)")
 
     gran = st.radio("Granularity", ["Daily", "Weekly", "Monthly"], horizontal=True)
@@ -329,20 +676,20 @@ with tabs[4]:
     clause, params = between_clause()
     disc = run_query(con, f"""
         WITH filtered AS (
-          SELECT * FROM listens WHERE {clause}
+          SELECT artist_id, day FROM daily_rollup WHERE {clause}
         ),
         first_seen AS (
-          SELECT artistName, MIN(date(endTime)) AS first_date FROM filtered GROUP BY artistName
+          SELECT artist_id, MIN(day) AS first_day FROM filtered GROUP BY artist_id
         ),
-        calendar AS (SELECT DISTINCT date(endTime) AS d FROM filtered),
+        calendar AS (SELECT DISTINCT day AS d FROM filtered),
         daily AS (
-          SELECT c.d, COALESCE(SUM(CASE WHEN f.first_date = c.d THEN 1 ELSE 0 END),0) AS new_artists
-          FROM calendar c LEFT JOIN first_seen f ON f.first_date = c.d
+          SELECT c.d, COALESCE(SUM(CASE WHEN f.first_day = c.d THEN 1 ELSE 0 END),0) AS new_artists
+          FROM calendar c LEFT JOIN first_seen f ON f.first_day = c.d
           GROUP BY c.d
         )
-        SELECT d AS date, new_artists,
+        SELECT date(d * 86400, 'unixepoch') AS date, new_artists,
                SUM(new_artists) OVER (ORDER BY d ROWS UNBOUNDED PRECEDING) AS cumulative_artists
-        FROM daily ORDER BY date;
+        FROM daily ORDER BY d;
     """, params)
 
     if disc.empty:
@@ -374,8 +721,66 @@ with tabs[4]:
         fig.tight_layout()
         st.pyplot(fig, use_container_width=True)
 
+# -------- Flow --------
+elif view == "Flow":
+    graph = transition_graph(con, db_fp)
+    if graph["track"] is None:
+        st.info("This database has no transition matrix; rebuild it with src/import_data.py.")
+    else:
+        st.caption("Counts of consecutive plays within a listening session, over the whole history "
+                   "(the date filter does not apply).")
+
+        def flow_table(ids, counts, total, names, label):
+            return pd.DataFrame({label: [names.get(i, "?") for i in ids], "times": counts,
+                                 "share_pct": np.round(100.0 * counts / max(total, 1), 1)})
+
+        text = st.text_input("Artist name", key="flow_artist", placeholder="e.g. son tung, den vau")
+        matches = artist_matches(con, db_fp, text) if text.strip() else []
+        if text.strip() and not matches:
+            st.info("No artist matches that name.")
+        if matches:
+            artist_id, name = st.selectbox("Matches", matches, format_func=lambda m: m[1], key="flow_match")
+            g = graph["artist"]
+            # other artists only: most plays are followed by the same artist
+            nxt, nxt_n = g.after(artist_id, 11)
+            prv, prv_n = g.before(artist_id, 11)
+            nxt, nxt_n = nxt[nxt != artist_id][:10], nxt_n[nxt != artist_id][:10]
+            prv, prv_n = prv[prv != artist_id][:10], prv_n[prv != artist_id][:10]
+            names = dict(run_query(con, """
+                SELECT artist_id, artistName FROM artists WHERE artist_id IN (SELECT value FROM json_each(?));
+            """, [json.dumps(sorted({*nxt.tolist(), *prv.tolist()}))]).to_numpy())
+            st.subheader(f"Artist flow around {name}")
+            left, right = st.columns(2)
+            left.markdown("**Came before**")
+            left.dataframe(flow_table(prv, prv_n, g.total_before(artist_id), names, "artistName"),
+                           use_container_width=True, hide_index=True)
+            right.markdown("**Came next**")
+            right.dataframe(flow_table(nxt, nxt_n, g.total_after(artist_id), names, "artistName"),
+                            use_container_width=True, hide_index=True)
+            st.caption(f"share_pct counts every play before / after {name}, including {name} itself.")
+
+            st.subheader("What do I usually play after…")
+            tracks = run_query(con, "SELECT track_id, trackName FROM tracks WHERE artist_id = ? ORDER BY trackName;", [artist_id])
+            if not tracks.empty:
+                track_id, track = st.selectbox("Track", list(tracks.itertuples(index=False, name=None)),
+                                               format_func=lambda t: t[1], key="flow_track")
+                g = graph["track"]
+                nxt, nxt_n = g.after(track_id, 10)
+                if not len(nxt):
+                    st.info(f"“{track}” was never followed by another play in the same session.")
+                else:
+                    after = run_query(con, """
+                        SELECT t.track_id, t.trackName || ' — ' || a.artistName AS label
+                        FROM tracks t JOIN artists a USING(artist_id)
+                        WHERE t.track_id IN (SELECT value FROM json_each(?));
+                    """, [json.dumps(nxt.tolist())])
+                    names = dict(after.to_numpy())
+                    st.dataframe(flow_table(nxt, nxt_n, g.total_after(track_id), names, "next track"),
+                                 use_container_width=True, hide_index=True)
+                    st.caption(f"Share of the {g.total_after(track_id)} times “{track}” was followed by another play.")
+
 # -------- Gallery --------
-with tabs[5]:
+elif view == "Gallery":
     st.subheader("All Charts in outputs/")
     OUT = ROOT.parent / "outputs"
     (OUT / "report_images").mkdir(parents=True, exist_ok=True)
@@ -388,7 +793,9 @@ with tabs[5]:
             try:
                 ns = runpy.run_path(str(SRC / script))
                 if "main" in ns:
-                    ns["main"]()
+                    # not streamlit's sys.argv; stale outputs only. run_path functions can't be
+                    # pickled for a process pool, so charts are drawn in-process
+                    ns["main"](["--jobs", "1"] if script == "eda_charts.py" else [])
                 logs.append(f"✅ Ran {script}")
             except Exception as e:
                 logs.append(f"⚠️ {script} failed: {e}")
@@ -412,21 +819,24 @@ with tabs[5]:
         st.code(msg, language="bash")
         imgs = sorted(OUT.glob("*.png")) + sorted((OUT / "report_images").glob("*.png"))
 
-    if not imgs:
-        st.stop()
-
-    for p in imgs:
-        st.markdown(f"**{p.relative_to(OUT)}**")
-        st.image(str(p), use_container_width=True)
-        st.divider()
-
-    # Download everything as a zip
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
-        for p in OUT.glob("*.png"): z.write(p, p.name)
-        for p in (OUT/"report_images").glob("*.png"): z.write(p, f"report_images/{p.name}")
-        for p in OUT.glob("*.csv"): z.write(p, p.name)
-        rp = OUT / "Spotify_Wrapped_Report.md"
-        if rp.exists(): z.write(rp, rp.name)
-    buf.seek(0)
-    st.download_button("⬇️ Download all outputs (.zip)", buf, "spotify_outputs.zip", mime="application/zip")
+    if imgs:
+        for p in imgs:
+            st.markdown(f"**{p.relative_to(OUT)}**")
+            st.image(str(p), use_container_width=True)
+            st.divider()
+
+        # Download everything as a zip
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+            for p in OUT.glob("*.png"): z.write(p, p.name)
+            for p in (OUT/"report_images").glob("*.png"): z.write(p, f"report_images/{p.name}")
+            for p in OUT.glob("*.csv"): z.write(p, p.name)
+            rp = OUT / "Spotify_Wrapped_Report.md"
+            if rp.exists(): z.write(rp, rp.name)
+        buf.seek(0)
+        st.download_button("⬇️ Download all outputs (.zip)", buf, "spotify_outputs.zip", mime="application/zip")
+
+# once per rerun, so the pool line stays up when every query was a cache hit
+if con is not None and not isinstance(con, sqlite3.Connection):
+    pool_stats.caption(con.stats())
+rerun_stats.caption(f"{view} rendered in {(time.perf_counter() - rerun_start) * 1000:.0f} ms")